@@ -9,6 +9,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
 
+from census_panel import CensusPanel, as_panel
+
 # ---------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------
@@ -26,45 +28,55 @@ FARM_BILL_LABELS = [
 # Load data
 # ---------------------------------------------------------------------
 print("Loading merged data...")
-df = pd.read_csv(DATA_FILE_PATH, sep="\t", low_memory=False)
-df['year'] = pd.to_numeric(df['year'], errors='coerce').astype('Int64')
+panel = CensusPanel.from_file(DATA_FILE_PATH)
 
 # ---------------------------------------------------------------------
 # Helper functions
 # ---------------------------------------------------------------------
 
-def _get_years(df: pd.DataFrame) -> list[int]:
-    yrs = pd.to_numeric(df['year'], errors='coerce').dropna().astype(int).unique().tolist()
-    return sorted(yrs)
+def _get_years(df: pd.DataFrame | CensusPanel) -> list[int]:
+    return as_panel(df).years
 
-def make_series_simple(df: pd.DataFrame,
+def make_series_simple(df: pd.DataFrame | CensusPanel,
                        y_col: str,
-                       geo: str = 'us',            # 'us' uses level==3; 'county' uses level==1
+                       geo: str = 'us',            # 'us' uses level==3; 'state' uses level==2; 'county' uses level==1
                        county_agg: str = 'mean',   # aggregation across counties per year
                        corn_positive: bool = False, # if True (county mode), keep counties with corn_for_grain_acres > 0
                        corn_filter_col: str = 'corn_for_grain_acres'
-                      ) -> tuple[list[int], list[float]]:
+                      ) -> tuple[list[int], list[float] | pd.DataFrame]:
     """
     Build a single series:
       - geo='us'    -> take the national (level==3) value each year (first non-missing).
+      - geo='state' -> (state x year) DataFrame of level==2 values (first non-missing),
+                       indexed by state name with one column per census year.
       - geo='county'-> aggregate county (level==1) values by year using county_agg.
     No arithmetic is performed beyond aggregation for county mode.
+    Pass a CensusPanel to reuse its sorted index across calls.
     """
-    if geo not in {'us', 'county'}:
-        raise ValueError("geo must be 'us' or 'county'")
-
-    years = _get_years(df)
+    if geo not in {'us', 'state', 'county'}:
+        raise ValueError("geo must be 'us', 'state' or 'county'")
+
+    panel = as_panel(df)
+    years = panel.years
+
+    if geo == 'state':
+        g = panel.states()
+        vals = pd.to_numeric(g[y_col], errors='coerce')
+        # one grouped pass -> rows = states, columns = years
+        matrix = (vals.groupby([g['name'], g['year']], observed=True).first()
+                      .unstack('year')
+                      .reindex(columns=years)
+                      .sort_index())
+        return years, matrix
 
     if geo == 'us':
-        g = df[df['level'] == 3].copy()
-        series = []
-        for y in years:
-            vals = pd.to_numeric(g.loc[g['year'] == y, y_col], errors='coerce').dropna()
-            series.append(vals.iloc[0] if len(vals) else np.nan)
+        g = panel.national()
+        by_year = pd.to_numeric(g[y_col], errors='coerce').groupby(g['year']).first()
+        series = [by_year.get(y, np.nan) for y in years]
         return years, series
 
     # county mode
-    g = df[df['level'] == 1].copy()
+    g = panel.counties().copy()
     if corn_positive and (corn_filter_col in g.columns):
         g[corn_filter_col] = pd.to_numeric(g[corn_filter_col], errors='coerce')
         g = g[g[corn_filter_col] > 0]
@@ -138,12 +150,68 @@ def plot_series_simple(years: list[int],
     return out_path
 
 
-def quick_timeseries(df: pd.DataFrame,
+def plot_state_small_multiples(years: list[int],
+                               matrix: pd.DataFrame,
+                               title: str,
+                               y_label: str,
+                               filename: str,
+                               ncols: int = 10,
+                               farm_bill_years: list[int] | None = None):
+    """
+    All state series (rows of `matrix`) as small multiples in one figure.
+    Axes are shared, so limits and ticks are computed once for the whole grid,
+    and each panel gets a single line artist plus one vlines collection.
+    """
+    plt.style.use('seaborn-v0_8')
+    n = len(matrix)
+    if n == 0 or not years:
+        print(f"No state rows to plot for {filename}")
+        return None
+    nrows = int(np.ceil(n / ncols))
+
+    fig, axes = plt.subplots(nrows, ncols, figsize=(2.0 * ncols, 1.6 * nrows),
+                             sharex=True, sharey=True)
+    axes = np.atleast_1d(axes).reshape(-1)
+
+    fby = [yr for yr in (farm_bill_years or FARM_BILL_YEARS) if years[0] <= yr <= years[-1]]
+    values = matrix.to_numpy(dtype=float)
+
+    for ax, name, row in zip(axes, matrix.index, values):
+        ax.plot(years, row, marker='o', linewidth=1.2, markersize=2.5)
+        if fby:
+            ax.vlines(fby, 0, 1, transform=ax.get_xaxis_transform(),
+                      colors='gray', linestyles='--', linewidth=0.6, alpha=0.5, zorder=0)
+        ax.set_title(str(name).title(), fontsize=8)
+        ax.grid(True, alpha=0.3)
+    # Hide unused axes
+    for ax in axes[n:]:
+        ax.set_axis_off()
+
+    # Shared axes: setting ticks on one panel applies to all
+    axes[0].set_xticks(years[::2])
+    for ax in axes[:n]:
+        ax.tick_params(labelsize=6)
+
+    fig.suptitle(title, fontsize=14, fontweight='bold')
+    fig.supxlabel('Census Year', fontsize=11)
+    fig.supylabel(y_label, fontsize=11)
+    plt.tight_layout()
+
+    out_dir = Path(OUTPUT_DIR) / FIGS_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / filename
+    plt.savefig(out_path, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+    print(f"✓ Saved plot to {out_path}")
+    return out_path
+
+
+def quick_timeseries(df: pd.DataFrame | CensusPanel,
                      y_col: str,
                      title: str,
                      y_label: str,
                      filename: str,
-                     geo: str = 'us',             # 'us' or 'county'
+                     geo: str = 'us',             # 'us', 'state' or 'county'
                      county_agg: str = 'mean',    # used only if geo='county'
                      corn_positive: bool = False, # used only if geo='county'
                      annotate_points: bool = True):
@@ -155,6 +223,14 @@ def quick_timeseries(df: pd.DataFrame,
         county_agg=county_agg,
         corn_positive=corn_positive
     )
+    if geo == 'state':
+        return plot_state_small_multiples(
+            years=years,
+            matrix=series,
+            title=title,
+            y_label=y_label,
+            filename=filename
+        )
     label = "United States (level 3)" if geo == 'us' else f"Counties ({county_agg})"
     return plot_series_simple(
         years=years,
@@ -171,7 +247,7 @@ def quick_timeseries(df: pd.DataFrame,
 # ---------------------------------------------------------------------
 
 quick_timeseries(
-    df,
+    panel,
     y_col=("gov_all_amt_real"),
     title="Total Federal Subsidies, Excluding CCC Loans (2017$)\nAg Census 1992–2022",
     y_label="2017 $s",
@@ -180,7 +256,7 @@ quick_timeseries(
 )
 
 quick_timeseries(
-    df,
+    panel,
     y_col=("gov_all_amt_real"),
     title="Total Federal Subsidies per County, Excluding CCC Loans (2017$)\nAg Census 1992–2022",
     y_label="2017 $s",
@@ -189,7 +265,7 @@ quick_timeseries(
 )
 
 quick_timeseries(
-    df,
+    panel,
     y_col=("farms_n"),
     title="Total Farms\nAg Census 1992–2022",
     y_label="Number of farms per county",
@@ -199,7 +275,16 @@ quick_timeseries(
 
 
 quick_timeseries(
-    df,
+    panel,
+    y_col=("gov_all_amt_real"),
+    title="Total Federal Subsidies by State, Excluding CCC Loans (2017$)\nAg Census 1992–2022",
+    y_label="2017 $s",
+    geo="state",
+    filename="gov_all_amt_real_states.png"
+)
+
+quick_timeseries(
+    panel,
     y_col=("gov_all_n"),
     title="Farms Receiving Federal Subsidies\nAg Census 1992–2022",
     y_label="Number of farms",
@@ -208,7 +293,7 @@ quick_timeseries(
 )
 
 quick_timeseries(
-    df,
+    panel,
     y_col=("share_corn_harvested_acres"),
     title="Share of Acres Harvested per County that are Corn\nAg Census 1992–2022",
     y_label="Corn acres as share of all harvested acres",
@@ -218,7 +303,7 @@ quick_timeseries(
 
 # 1) Government payments per farm (real)
 quick_timeseries(
-    df,
+    panel,
     y_col="gov_all_pf_real",
     title="Average Federal Subsidies per Farm (2017$)\nAg Census 1992–2022",
     y_label="2017 $ per farm",
@@ -228,7 +313,7 @@ quick_timeseries(
 
 # 2) Non-conservation government payments per farm (real)
 quick_timeseries(
-    df,
+    panel,
     y_col=("gov_noncons_pf_calc_real"),
     title="Non-Conservation Federal Subsidies per Farm (2017$)\nAg Census 1992–2022",
     y_label="2017 $ per farm",
@@ -239,7 +324,7 @@ quick_timeseries(
 
 
 quick_timeseries(
-    df,
+    panel,
     y_col=("ccc_loan_amt_real"),
     title="Total CCC Loans Disbursed (2017$)\nAg Census 1992–2022",
     y_label="2017 $s",
@@ -247,7 +332,7 @@ quick_timeseries(
 )
 
 quick_timeseries(
-    df,
+    panel,
     y_col=("ccc_loan_n"),
     title="Number of Farms Receiving CCC Loans (2017$)\nAg Census 1992–2022",
     y_label="Number of farms",
@@ -256,7 +341,7 @@ quick_timeseries(
 
 # 3) CCC loans per farm (real, amounts in $1,000s)
 quick_timeseries(
-    df,
+    panel,
     y_col=("ccc_loan_pf_real"),
     title="CCC Loans per Farm (2017$)\nAg Census 1992–2022",
     y_label="2017 $ per farm",
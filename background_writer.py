@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Background writers for large TSV outputs.
+
+Frames are queued to a small thread (or process) pool so the caller keeps
+computing while earlier frames serialize. Every write goes to a temp file
+next to its target and is renamed into place, so readers never see a
+partial file; completion is logged with rows, size and seconds.
+
+Compression follows the target's suffix: .zst is multithreaded zstd, .gz is
+gzip (single-threaded, fixed mtime so identical data gives identical bytes).
+output_path() picks the suffix for a codec, falling back from zstd to gzip
+when the zstandard package is not installed. pandas (and
+census_panel.read_panel_tsv) decompress both transparently.
+
+    with BackgroundWriter() as writer:
+        writer.submit(df_1992, out_dir / "census_1992_filtered.tsv")
+        ...                                   # keep computing
+    # leaving the block waits for all writes and re-raises the first error
+"""
+
+import os
+import time
+import functools
+import logging
+import importlib.util
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+
+logger = logging.getLogger(__name__)
+
+WRITER_WORKERS = 2
+COMPRESSION_LEVEL = 3
+COMPRESSION_THREADS = -1    # zstd worker threads; -1 = one per core
+CODEC_SUFFIX = {'zstd': '.zst', 'gzip': '.gz', None: ''}
+
+
+@functools.lru_cache(maxsize=None)
+def _zstd_available() -> bool:
+    ok = importlib.util.find_spec('zstandard') is not None
+    if not ok:
+        logger.warning("zstandard not installed; writing gzip instead of zstd")
+    return ok
+
+
+def output_path(path, codec: str = None) -> Path:
+    """`path` with the codec's suffix appended (zstd -> gzip if zstandard is missing)."""
+    if codec == 'zstd' and not _zstd_available():
+        codec = 'gzip'
+    if codec not in CODEC_SUFFIX:
+        raise ValueError(f"Unknown codec {codec!r}; use one of {list(CODEC_SUFFIX)}")
+    path = Path(path)
+    suffix = CODEC_SUFFIX[codec]
+    return path if not suffix or path.suffix == suffix else path.with_name(path.name + suffix)
+
+
+def _compression(path: Path, threads: int):
+    if path.suffix == '.zst':
+        return {'method': 'zstd', 'level': COMPRESSION_LEVEL, 'threads': threads}
+    if path.suffix == '.gz':
+        return {'method': 'gzip', 'compresslevel': 6, 'mtime': 0}
+    return None
+
+
+def _siblings(path: Path) -> list:
+    """The same output under the other codecs (x.tsv, x.tsv.zst, x.tsv.gz), excluding `path`."""
+    base = path.with_suffix('') if path.suffix in ('.zst', '.gz') else path
+    return [p for p in (base.with_name(base.name + sfx) for sfx in CODEC_SUFFIX.values()) if p != path]
+
+
+def write_frame(df: pd.DataFrame, path, sep: str = '\t', threads: int = COMPRESSION_THREADS) -> Path:
+    """
+    Write df to a temp file next to `path` and rename it into place (compressed
+    per suffix). Copies left under another codec by earlier runs are removed,
+    so readers that fall back between .tsv/.zst/.gz never pick up a stale one.
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.tmp")
+    try:
+        df.to_csv(tmp, sep=sep, index=False, compression=_compression(path, threads))
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    for stale in _siblings(path):
+        if stale.exists():
+            stale.unlink()
+            logger.info(f"Removed superseded {stale}")
+    return path
+
+
+def _timed_write(df: pd.DataFrame, path: str, kwargs: dict):
+    t0 = time.perf_counter()
+    out = write_frame(df, path, **kwargs)
+    return str(out), len(df), out.stat().st_size, time.perf_counter() - t0
+
+
+class BackgroundWriter:
+    """Queue of atomic frame writes on background threads or processes."""
+
+    def __init__(self, max_workers: int = WRITER_WORKERS, processes: bool = False):
+        # threads suit I/O-bound (network) storage; processes also overlap the
+        # GIL-holding part of to_csv at the cost of pickling each frame
+        executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self._pool = executor(max_workers=max_workers)
+        self._pending = []
+        self.completed = []   # (path, rows, bytes, seconds) in completion order
+
+    def submit(self, df: pd.DataFrame, path, **kwargs) -> Future:
+        """Queue one frame; returns a Future resolving to (path, rows, bytes, seconds)."""
+        fut = self._pool.submit(_timed_write, df, str(path), kwargs)
+        fut.add_done_callback(self._report)
+        self._pending.append(fut)
+        return fut
+
+    def _report(self, fut: Future):
+        if fut.cancelled():
+            return
+        exc = fut.exception()
+        if exc is not None:
+            logger.error(f"✗ Background write failed: {exc}")
+            return
+        path, rows, size, secs = fut.result()
+        self.completed.append((path, rows, size, secs))
+        logger.info(f"✓ Wrote {path} ({rows} rows, {size / 2**20:.1f} MiB, {secs:.1f}s)")
+
+    def wait(self) -> list:
+        """Block until every queued write is done; re-raise the first failure."""
+        pending, self._pending = self._pending, []
+        errors = [f.exception() for f in pending if f.exception() is not None]
+        if errors:
+            raise errors[0]
+        return self.completed
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # don't mask the caller's error with a writer error
+            self._pool.shutdown(wait=True)
+        return False
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+CensusPanel: the merged Agricultural Census output (1992–2022), loaded once and
+sorted by (level, year, fips) so that slices are index ranges instead of
+boolean masks over the full frame.
+
+    panel = CensusPanel.from_file(DATA_FILE_PATH)
+    panel.counties(2017)              # one year's county rows
+    panel.county_history(19153)       # one county across all years
+    panel.states()                    # all state rows, every year
+    panel.wide('farms_n', level=2)    # (state x year) matrix for one variable
+
+Frames are held in the compact PANEL_SCHEMA (categorical name, small nullable
+integer keys, float32 where that is lossless); compact_panel() applies it to
+any merged frame and memory_report() shows what each column costs.
+"""
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+COUNTY, STATE, NATIONAL = 1, 2, 3
+
+# sentinels that sort missing keys after every real value
+_NA_LEVEL, _NA_YEAR, _NA_FIPS = 9, 9999, 99999
+
+COMPRESSED_SUFFIXES = ('.zst', '.gz')
+
+
+def read_panel_tsv(path, **kwargs) -> pd.DataFrame:
+    """
+    Read a panel TSV, plain or compressed (.zst/.gz, inferred from the name).
+    A plain .tsv path also matches its compressed siblings (path.zst, path.gz),
+    so configs pointing at the .tsv keep working; if several exist, the most
+    recently written one wins, so a stale copy from an earlier codec is never
+    read in place of the current output.
+    """
+    path = Path(path)
+    if path.suffix not in COMPRESSED_SUFFIXES:
+        found = [p for p in [path] + [path.with_name(path.name + sfx) for sfx in COMPRESSED_SUFFIXES]
+                 if p.exists()]
+        if found:
+            path = max(found, key=lambda p: p.stat().st_mtime)
+    return pd.read_csv(path, sep=kwargs.pop('sep', '\t'), low_memory=False, **kwargs)
+
+
+# Identifier dtypes of the merged panel. Float value columns drop to float32
+# only when every value survives the round trip: float32 keeps ~7 significant
+# digits, too few for state and national dollar or bushel totals, so those
+# (and anything listed in FLOAT64_COLS) stay float64.
+PANEL_SCHEMA = {
+    'year': 'Int32',
+    'fips': 'Int32',
+    'level': 'Int8',
+    'statefip': 'Int8',
+    'counfip': 'Int16',
+    'name': 'category',
+}
+FLOAT64_COLS = {'price_deflator'}
+
+
+def _float32_exact(s: pd.Series) -> bool:
+    """True if every value of a float column is exactly representable as float32."""
+    vals = s.to_numpy('float64', na_value=np.nan)
+    return bool(np.array_equal(vals.astype(np.float32).astype('float64'), vals, equal_nan=True))
+
+
+def compact_panel(df: pd.DataFrame, float64_cols=FLOAT64_COLS) -> pd.DataFrame:
+    """
+    Cast identifiers to PANEL_SCHEMA, float value columns to float32 where that
+    is exact (see _float32_exact) and integer value columns (e.g. *_imp_flag)
+    to the smallest integer type. Text value columns are left alone. Operates
+    in place and returns df.
+    """
+    for col, dtype in PANEL_SCHEMA.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    for col in df.columns:
+        if col in PANEL_SCHEMA or col in float64_cols:
+            continue
+        s = df[col]
+        if pd.api.types.is_float_dtype(s) and s.dtype != np.float32:
+            if _float32_exact(s):
+                df[col] = s.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            df[col] = pd.to_numeric(s, downcast='integer')
+    return df
+
+
+def memory_report(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bytes per column as held (deep) next to the same column as float64/object,
+    i.e. what the untyped text round-trip would give. Last row is the total.
+    """
+    rows = []
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype) or s.dtype == object:
+            wide = s.astype(object)
+        elif pd.api.types.is_numeric_dtype(s):
+            wide = pd.to_numeric(s, errors='coerce').astype('float64')
+        else:
+            wide = s
+        rows.append({'column': col, 'dtype': str(s.dtype),
+                     'bytes': int(s.memory_usage(index=False, deep=True)),
+                     'bytes_untyped': int(wide.memory_usage(index=False, deep=True))})
+    out = pd.DataFrame(rows)
+    total = {'column': 'TOTAL', 'dtype': '', 'bytes': int(out['bytes'].sum()),
+             'bytes_untyped': int(out['bytes_untyped'].sum())}
+    return pd.concat([out, pd.DataFrame([total])], ignore_index=True)
+
+
+class CensusPanel:
+    """Sorted, range-indexed view of the merged census panel."""
+
+    def __init__(self, df: pd.DataFrame,
+                 level_col: str = 'level',
+                 year_col: str = 'year',
+                 fips_col: str = 'fips'):
+        self.level_col, self.year_col, self.fips_col = level_col, year_col, fips_col
+        df = compact_panel(df.copy())
+        for c in (level_col, year_col, fips_col):
+            if c not in df.columns:
+                df[c] = pd.array([pd.NA] * len(df), dtype='Int32')
+            elif not pd.api.types.is_integer_dtype(df[c]):
+                df[c] = pd.to_numeric(df[c], errors='coerce').astype('Int32')
+
+        level = df[level_col].fillna(_NA_LEVEL).to_numpy('int64')
+        year = df[year_col].fillna(_NA_YEAR).to_numpy('int64')
+        fips = df[fips_col].fillna(_NA_FIPS).to_numpy('int64')
+
+        order = np.lexsort((fips, year, level))
+        self.df = df.iloc[order].reset_index(drop=True)
+        self._level, self._year, self._fips = level[order], year[order], fips[order]
+        # primary key: (level, year, fips) -> monotone int64
+        self._key = (self._level * 10_000 + self._year) * 100_000 + self._fips
+        self._by_fips = None   # secondary (level, fips, year) order, built on first use
+
+    @classmethod
+    def from_file(cls, path, sep: str = '\t', **kwargs) -> 'CensusPanel':
+        return cls(read_panel_tsv(path, sep=sep), **kwargs)
+
+    # -----------------------------
+    # Index-range slices
+    # -----------------------------
+    def _range(self, lo: int, hi: int) -> pd.DataFrame:
+        a = np.searchsorted(self._key, lo, side='left')
+        b = np.searchsorted(self._key, hi, side='right')
+        return self.df.iloc[a:b]
+
+    def level(self, level: int, year: int = None) -> pd.DataFrame:
+        """All rows of one level, optionally for one year."""
+        if year is None:
+            lo = (level * 10_000) * 100_000
+            hi = (level * 10_000 + _NA_YEAR - 1) * 100_000 + _NA_FIPS
+        else:
+            lo = (level * 10_000 + year) * 100_000
+            hi = lo + _NA_FIPS
+        return self._range(lo, hi)
+
+    def counties(self, year: int = None) -> pd.DataFrame:
+        return self.level(COUNTY, year)
+
+    def states(self, year: int = None) -> pd.DataFrame:
+        return self.level(STATE, year)
+
+    def national(self, year: int = None) -> pd.DataFrame:
+        return self.level(NATIONAL, year)
+
+    def row(self, level: int, year: int, fips: int) -> pd.DataFrame:
+        key = (level * 10_000 + year) * 100_000 + fips
+        return self._range(key, key)
+
+    def county_history(self, fips: int, level: int = COUNTY) -> pd.DataFrame:
+        """One geography's rows across all years (sorted by year)."""
+        if self._by_fips is None:
+            order = np.lexsort((self._year, self._fips, self._level))
+            key = (self._level[order] * 100_000 + self._fips[order]) * 10_000 + self._year[order]
+            self._by_fips = (order, key)
+        order, key = self._by_fips
+        lo = (level * 100_000 + fips) * 10_000
+        a = np.searchsorted(key, lo, side='left')
+        b = np.searchsorted(key, lo + _NA_YEAR, side='right')
+        return self.df.iloc[order[a:b]]
+
+    # -----------------------------
+    # Convenience
+    # -----------------------------
+    @property
+    def years(self) -> list:
+        return sorted(int(y) for y in np.unique(self._year) if y != _NA_YEAR)
+
+    def wide(self, col: str, level: int = STATE, index: str = None) -> pd.DataFrame:
+        """(geography x year) matrix for one variable; index defaults to fips."""
+        g = self.level(level)
+        vals = pd.to_numeric(g[col], errors='coerce')
+        idx = g[index or self.fips_col]
+        return vals.groupby([idx, g[self.year_col]], observed=True).first().unstack(self.year_col)
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+
+def as_panel(obj) -> CensusPanel:
+    """Accept a CensusPanel or a raw merged DataFrame."""
+    return obj if isinstance(obj, CensusPanel) else CensusPanel(obj)
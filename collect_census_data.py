@@ -299,12 +299,25 @@ Census years and corresponding variable names:
 """
 
 import os
+import io
+import json
+import gzip
+import queue
 import shutil
+import zipfile
+import threading
 import pandas as pd
 from pathlib import Path
 import logging
 import numpy as np
 import re 
+from scipy import sparse
+
+from panel_cube import write_panel_cube
+from census_panel import compact_panel, memory_report, read_panel_tsv
+from background_writer import BackgroundWriter, write_frame, output_path
+from stata_export import write_dta
+from panel_diff import write_hash_manifest, compare_manifests, rotate_manifest
 
 # -----------------------------------
 # Logging
@@ -319,6 +332,49 @@ logger = logging.getLogger(__name__)
 NASS_2017_FILE = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/NASS_2017-2022/qs.census2017.txt"
 NASS_2022_FILE = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/NASS_2017-2022/qs.census2022.txt"
 
+INTERIM_DIR = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/interim"
+DEFLATOR_FILE = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/deflator/price_index_A191RG_BEA.csv"
+
+# All years are filtered and merged in memory. Per-year filtered TSVs
+# (interim/{year}/census_{year}_filtered.tsv) are an optional side output,
+# written in the background; nothing reads them back.
+WRITE_INTERIM_FILES = False
+
+# Background writers (merged TSVs, partitions, interim files): temp file +
+# rename, so compute continues while earlier outputs serialize.
+WRITER_WORKERS = 2
+WRITER_PROCESSES = False   # True: processes instead of threads (pickles each frame)
+
+# Codec for interim/output TSVs: 'zstd' (multithreaded; gzip if zstandard is
+# not installed), 'gzip', or None for plain text. Readers detect it from the
+# file name, and a configured plain .tsv path also finds its .zst/.gz sibling.
+OUTPUT_CODEC = "zstd"
+
+# Census years handled by the full build. New NASS years are added either here
+# (full rebuild) or with `collect_census_data.py ingest-year YEAR FILE`, which
+# appends one partition to interim/panel/ without reprocessing or rewriting
+# existing years. It does re-read them: all partitions are loaded to regenerate
+# the merged deflated outputs. The full (nominal + deflator) TSV is not
+# partitioned, so it stays stale until the next full build.
+ICPSR_DIR = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/ICPSR_1850-2012"
+ICPSR_FOLDERS = {"DS0042": 1992, "DS0043": 1997, "DS0044": 2002, "DS0045": 2007, "DS0047": 2012}
+ICPSR_YEARS = sorted(ICPSR_FOLDERS.values())
+
+# Raw inputs may stay compressed: every configured path (ICPSR year file, NASS
+# file) is also looked up with .gz/.zst/.zip appended, and ICPSR years missing
+# under ICPSR_DIR are read straight out of the ICPSR 35206 download zip.
+# Decompression runs on a background thread while pandas parses; NASS rows are
+# filtered chunk by chunk (TOTAL domain, supported levels, mapped SHORT_DESCs).
+ICPSR_ZIP = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/ICPSR_35206.zip"
+RAW_SUFFIXES = ('', '.gz', '.zst', '.zip')
+RAW_CHUNK_ROWS = 500_000
+NASS_FILES = {
+    2017: NASS_2017_FILE,
+    2022: NASS_2022_FILE,
+}
+CENSUS_YEARS = ICPSR_YEARS + list(NASS_FILES)
+PANEL_DIR_NAME = "panel"            # per-year partitions + manifest.json
+
 VARIABLE_MAPPING = {
     'farms_n': {  
         'deflate': False,
@@ -552,6 +608,95 @@ MANUAL_CALCS = [
     }
 ]
 
+# Panel window operations, run right after MANUAL_CALCS over (level, fips, year).
+# Supported ops:
+#   'lag'               value of the same geography k * CENSUS_INTERVAL years earlier ("periods": k, default 1);
+#                       NaN when that census is missing, never a longer gap
+#   'growth'            census-to-census growth, value / lag - 1 ("periods" as for lag)
+#   'share_of_state'    county value / its state's value in the same year
+#   'share_of_national' county or state value / the US value in the same year
+CENSUS_INTERVAL = 5   # years between censuses
+PANEL_CALCS = [
+    {"name": "gov_all_amt_real_lag",             "op": "lag",               "input": "gov_all_amt_real"},
+    {"name": "gov_all_amt_real_growth",          "op": "growth",            "input": "gov_all_amt_real"},
+    {"name": "farms_n_growth",                   "op": "growth",            "input": "farms_n"},
+    {"name": "corn_for_grain_acres_growth",      "op": "growth",            "input": "corn_for_grain_acres"},
+    {"name": "gov_all_amt_real_share_state",     "op": "share_of_state",    "input": "gov_all_amt_real"},
+    {"name": "corn_for_grain_acres_share_state", "op": "share_of_state",    "input": "corn_for_grain_acres"},
+    {"name": "gov_all_amt_real_share_us",        "op": "share_of_national", "input": "gov_all_amt_real"},
+    {"name": "corn_for_grain_acres_share_us",    "op": "share_of_national", "input": "corn_for_grain_acres"},
+]
+
+
+# County boundary harmonization (constant geography across 1992–2022).
+# Each entry sends a source county FIPS to one or more target FIPS. Whole-county
+# renumberings/mergers use a single target. Split sources take explicit area
+# "weights" if given; otherwise they are farm-weighted by the targets'
+# CROSSWALK_WEIGHT_COL in the same year. CROSSWALK_FILE (from,to,weight CSV), if
+# present, extends this list.
+HARMONIZE_COUNTIES = True
+CROSSWALK_WEIGHT_COL = "farms_n"
+CROSSWALK_FILE = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/county_crosswalk.csv"
+FIPS_CROSSWALK = [
+    {"from": 12025, "to": [12086]},                    # Dade FL -> Miami-Dade (renumbered 1997)
+    {"from": 51780, "to": [51083]},                    # South Boston city VA -> Halifax (1995)
+    {"from": 51560, "to": [51005]},                    # Clifton Forge city VA -> Alleghany (2001)
+    {"from": 51515, "to": [51019]},                    # Bedford city VA -> Bedford County (2013)
+    {"from": 46113, "to": [46102]},                    # Shannon SD -> Oglala Lakota (2015)
+    {"from": 2270,  "to": [2158]},                     # Wade Hampton AK -> Kusilvak (2015)
+    {"from": 8014,  "to": [8001, 8013, 8059, 8123]},   # Broomfield CO (2001) -> Adams, Boulder, Jefferson, Weld
+]
+
+# Hierarchy check (county -> state -> national) run after the manual calculations.
+# A group fails when its children overshoot the reported total by more than the
+# tolerance, or miss it by more than the tolerance with no suppressed children.
+VALIDATE_TOTALS = True
+TOTALS_TOLERANCE = 0.01   # relative
+ADDITIVE_VARS = [
+    'farms_n', 'crop_acres', 'harvested_acres', 'corn_for_grain_acres', 'corn_for_grain_bu',
+    'corn_for_silage_acres', 'gov_all_n', 'gov_all_amt', 'gov_cons_amt', 'gov_cons_n',
+    'ccc_loan_amt', 'ccc_loan_n',
+]
+
+# Suppressed-county imputation: the state total minus disclosed counties is
+# spread over the suppressed counties in proportion to a proxy column.
+# Adds <var>_imp and <var>_imp_flag (1 = imputed, 0 = reported) for each var;
+# monetary variables are imputed in real terms.
+IMPUTE_SUPPRESSED = True
+IMPUTE_VARS = [f"{v}_real" if VARIABLE_MAPPING[v]['deflate'] else v for v in ADDITIVE_VARS]
+IMPUTE_PROXY = 'farms_n'
+IMPUTE_PROXY_OVERRIDES = {
+    'corn_for_grain_acres': 'harvested_acres',
+    'corn_for_grain_bu': 'harvested_acres',
+    'corn_for_silage_acres': 'harvested_acres',
+}
+
+# Merged outputs every downstream script reads (written by the full build and
+# regenerated from the partitions by ingest-year)
+DEFLATED_FILE = "census_merged_1992_2022_deflated.tsv"
+FULL_FILE = "census_merged_1992_2022_full.tsv"
+
+# Dense float32 (variable x year x county) memory-mapped copy of the deflated panel
+WRITE_PANEL_CUBE = True
+
+# Labeled Stata copy of the deflated panel (graph.do `use`s it). Variable labels
+# come from the VARIABLE_MAPPING comments and nass_short_desc; `level` and the
+# *_imp_flag columns get value labels.
+WRITE_STATA = True
+STATA_FILE = "census_merged_1992_2022_deflated.dta"
+LEVEL_LABELS = {1: "County", 2: "State", 3: "National"}
+
+# Per-(column, year) content hashes of the deflated panel; the previous run's
+# manifest is kept as *.prev.json and compared on every build (see panel_diff.py).
+HASH_MANIFEST_FILE = "census_merged_1992_2022_deflated.hashes.json"
+# Also keep the previous deflated TSV as *.prev.tsv.zst for `panel_diff.py --cells`.
+# Off by default: it is a second copy of the largest output (hard links are not
+# deduplicated by Dropbox), so turn it on only for runs you want to diff cell by cell.
+KEEP_PREVIOUS_SNAPSHOT = False
+
+# Bytes per column of the deflated panel (compact dtypes vs float64/object);
+# the dtype plan itself is census_panel.PANEL_SCHEMA.
+MEMORY_REPORT_FILE = "memory_report.tsv"
 
 
 STATE_NAMES = [
@@ -567,16 +712,21 @@ STATE_NAMES = [
 # Helpers
 # -----------------------------------
 
-def setup_directories():
+def setup_directories(years=None, interim_dir=INTERIM_DIR):
     """Create interim directory structure if it doesn't exist."""
-    interim_dir = Path("/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/interim")
+    interim_dir = Path(interim_dir)
     interim_dir.mkdir(exist_ok=True)
-    for year in [1992, 1997, 2002, 2007, 2012, 2017, 2022]:
+    for year in years or CENSUS_YEARS:
         (interim_dir / str(year)).mkdir(exist_ok=True)
+    (interim_dir / PANEL_DIR_NAME).mkdir(exist_ok=True)
     return interim_dir
 
 def _as_number(series: pd.Series) -> pd.Series:
     """Coerce strings like '$1,234' or '1,234.5' to float; keep NaNs."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        # already numeric: str() of a float can be '8.945123e+09', which the
+        # strip below would turn into 8.945123
+        return pd.to_numeric(series, errors='coerce').astype('float64')
     return (
         series.astype(str)
               .str.replace(r'[^\d\.\-]', '', regex=True)
@@ -627,8 +777,10 @@ def standardize_geo_names(df: pd.DataFrame) -> pd.DataFrame:
     if 'level' not in df.columns or 'name' not in df.columns:
         return df
 
-    # Ensure numeric levels
-    df['level'] = pd.to_numeric(df['level'], errors='coerce').astype('Int64')
+    # Ensure numeric levels; names are rewritten, so drop any categorical dtype
+    df['level'] = pd.to_numeric(df['level'], errors='coerce').astype('Int8')
+    if isinstance(df['name'].dtype, pd.CategoricalDtype):
+        df['name'] = df['name'].astype(object)
 
     # COUNTY rows → county name only
     m_county = df['level'] == 1
@@ -644,10 +796,143 @@ def standardize_geo_names(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
+class _PrefetchStream(io.RawIOBase):
+    """
+    Read (and decompress) `fileobj` on a background thread, one block ahead of
+    the parser. `owner` (e.g. the ZipFile a member was opened from) is closed
+    together with `fileobj` once reading ends or the stream is closed.
+    """
+
+    def __init__(self, fileobj, block_size: int = 1 << 22, depth: int = 4, owner=None):
+        self._q = queue.Queue(maxsize=depth)
+        self._buf, self._pos, self._eof = b'', 0, False
+        self._src, self._owner = fileobj, owner
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._pump, args=(block_size,), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _pump(self, block_size):
+        try:
+            while not self._stop.is_set():
+                block = self._src.read(block_size)
+                self._put(block)
+                if not block:
+                    break
+        except Exception as e:
+            self._put(e)
+        finally:
+            self._src.close()
+            if self._owner is not None:
+                self._owner.close()
+
+    def close(self):
+        # lets the reader thread exit if parsing stopped early
+        self._stop.set()
+        super().close()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos >= len(self._buf) and not self._eof:
+            item = self._q.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self._eof = True
+            self._buf, self._pos = item, 0
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def resolve_raw_input(path):
+    """`path` if it exists, else the first existing compressed sibling (path.gz/.zst/.zip); None if none."""
+    path = Path(path)
+    for suffix in RAW_SUFFIXES:
+        cand = path.with_name(path.name + suffix) if suffix else path
+        if cand.exists():
+            return cand
+    return None
+
+
+def open_raw(path, member: str = None):
+    """
+    Binary stream over a raw input, decompressing .gz/.zst/.zip on the fly in a
+    background thread. For a .zip, `member` names the file inside it (default:
+    the only .tsv/.txt/.csv member).
+    """
+    path = Path(path)
+    owner = None
+    if path.suffix == '.gz':
+        src = gzip.open(path, 'rb')
+    elif path.suffix == '.zst':
+        import zstandard
+        src = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    elif path.suffix == '.zip':
+        owner = zipfile.ZipFile(path)
+        try:
+            if member is None:
+                names = [n for n in owner.namelist() if n.lower().endswith(('.tsv', '.txt', '.csv'))]
+                if len(names) != 1:
+                    raise ValueError(f"{path}: name the member to read, found {names}")
+                member = names[0]
+            src = owner.open(member)
+        except Exception:
+            owner.close()
+            raise
+    else:
+        src = open(path, 'rb')
+    return io.BufferedReader(_PrefetchStream(src, owner=owner), buffer_size=1 << 20)
+
+
+def read_raw_table(path, member: str = None, row_filter=None, chunksize: int = RAW_CHUNK_ROWS, **kwargs) -> pd.DataFrame:
+    """
+    Tab-separated raw table from a plain or compressed file. With `row_filter`
+    (frame -> frame) the file is parsed in chunks and only kept rows are held.
+    """
+    with open_raw(path, member) as fh:
+        if row_filter is None:
+            return pd.read_csv(fh, sep='\t', low_memory=False, **kwargs)
+        parts = [row_filter(chunk) for chunk in pd.read_csv(fh, sep='\t', chunksize=chunksize, **kwargs)]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+NASS_COLUMNS = ['YEAR', 'AGG_LEVEL_DESC', 'SHORT_DESC', 'DOMAIN_DESC', 'STATE_NAME', 'COUNTY_NAME',
+                'COUNTRY_NAME', 'UNIT_DESC', 'STATE_FIPS_CODE', 'COUNTY_CODE', 'VALUE']
+
+
+def _nass_row_filter(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Keep TOTAL-domain county/state/national rows for mapped SHORT_DESCs."""
+    wanted = {str(cfg['nass_short_desc']).strip().upper()
+              for cfg in VARIABLE_MAPPING.values() if cfg.get('nass_short_desc')}
+    keep = chunk['SHORT_DESC'].astype(str).str.strip().str.upper().isin(wanted)
+    keep &= chunk['AGG_LEVEL_DESC'].astype(str).str.strip().str.upper().isin(['COUNTY', 'STATE', 'NATIONAL'])
+    if 'DOMAIN_DESC' in chunk.columns:
+        keep &= chunk['DOMAIN_DESC'].astype(str).str.strip().str.upper() == 'TOTAL'
+    return chunk[keep]
+
+
 def load_nass_census_data(file_path, year):
-    """Load NASS census data TSV."""
+    """Load the rows of a NASS census TSV (plain or .gz/.zst/.zip) that the pipeline maps."""
+    source = resolve_raw_input(file_path)
+    if source is None:
+        logger.error(f"NASS {year} file not found: {file_path}")
+        return None
     try:
-        df = pd.read_csv(file_path, sep='\t', low_memory=False)
+        df = read_raw_table(source, row_filter=_nass_row_filter,
+                            usecols=lambda c: c in NASS_COLUMNS,
+                            dtype={'STATE_FIPS_CODE': str, 'COUNTY_CODE': str, 'VALUE': str})
+        logger.info(f"Loaded {len(df)} mapped rows from {source}")
         return df
     except Exception as e:
         logger.error(f"Error loading NASS {year} data: {e}")
@@ -685,7 +970,7 @@ def normalize_fips_after_merge(df: pd.DataFrame) -> pd.DataFrame:
       - NATIONAL (level==3): fips = 99000
       - STATE    (level==2): fips = numeric(statefip)  [2-digit, no leading zero kept]
       - COUNTY   (level==1): if both parts present, fips = int(SS.zfill(2)+CCC.zfill(3)); else NA
-    Ensures no 0-valued FIPS from missing parts; uses pandas nullable Int64.
+    Ensures no 0-valued FIPS from missing parts; returns the compact PANEL_SCHEMA dtypes.
     """
     df = df.copy()
     # Coerce level to numeric
@@ -727,9 +1012,109 @@ def normalize_fips_after_merge(df: pd.DataFrame) -> pd.DataFrame:
     m_zero_bad = df['fips'].fillna(-1).eq(0) & ~m_nat
     df.loc[m_zero_bad, 'fips'] = pd.NA
 
-    # Keep nullable Int64
-    df['fips'] = df['fips'].astype('Int64')
-    return df
+    return compact_panel(df)
+
+
+def _crosswalk_table(crosswalk: list, crosswalk_file=None) -> pd.DataFrame:
+    """Flatten crosswalk specs (+ optional CSV) to from/to/weight rows; weight NaN = farm-weighted."""
+    rows = []
+    for spec in crosswalk or []:
+        targets = spec.get("to") or []
+        weights = spec.get("weights") or [np.nan] * len(targets)
+        if len(targets) == 1 and not spec.get("weights"):
+            weights = [1.0]
+        rows += [(int(spec["from"]), int(t), float(w)) for t, w in zip(targets, weights)]
+    table = pd.DataFrame(rows, columns=["from", "to", "weight"])
+    if crosswalk_file and Path(crosswalk_file).exists():
+        extra = pd.read_csv(crosswalk_file)
+        extra = extra.reindex(columns=["from", "to", "weight"])
+        table = pd.concat([table[~table["from"].isin(extra["from"])], extra], ignore_index=True)
+        logger.info(f"Loaded {len(extra)} crosswalk rows from {crosswalk_file}")
+    return table.astype({"from": "int64", "to": "int64", "weight": "float64"})
+
+
+def harmonize_county_fips(df: pd.DataFrame,
+                          crosswalk: list = FIPS_CROSSWALK,
+                          weight_col: str = CROSSWALK_WEIGHT_COL,
+                          crosswalk_file=CROSSWALK_FILE) -> pd.DataFrame:
+    """
+    Rebuild county rows on a constant geography through one sparse matrix product.
+      - M is (target county-year x source county-year); unchanged counties map to
+        themselves with weight 1, crosswalk sources spread over their targets.
+      - Additive variables: M @ X. Per-farm variables ('*_pf'): weight_col-weighted
+        mean, M @ (X*w) / M @ w. A target stays NaN if none of its sources reported.
+    State/national rows and counties without FIPS pass through unchanged.
+    """
+    value_cols = [c for c in VARIABLE_MAPPING if c in df.columns]
+    is_county = (df['level'] == 1) & df['fips'].notna()
+    counties = df[is_county].reset_index(drop=True)
+    rest = df[~is_county]
+    if counties.empty or not value_cols:
+        return df
+
+    table = _crosswalk_table(crosswalk, crosswalk_file)
+
+    # one link per (source row, target); identity for counties not in the crosswalk
+    src = pd.DataFrame({'year': counties['year'].to_numpy(),
+                        'fips': counties['fips'].astype('int64').to_numpy(),
+                        'src_row': np.arange(len(counties))})
+    links = src.merge(table, left_on='fips', right_on='from', how='left')
+    mapped = links['to'].notna()
+    links['to'] = links['to'].where(mapped, links['fips']).astype('int64')
+    links['weight'] = links['weight'].where(mapped, 1.0)
+
+    # farm-weighted shares for split sources without explicit weights
+    X = counties[value_cols].apply(pd.to_numeric, errors='coerce')
+    w_all = (X[weight_col] if weight_col in X.columns
+             else pd.Series(1.0, index=X.index)).fillna(0.0)
+    if links['weight'].isna().any():
+        w_lookup = pd.Series(w_all.to_numpy(), index=pd.MultiIndex.from_arrays([src['year'], src['fips']]))
+        w_lookup = w_lookup[~w_lookup.index.duplicated()]
+        tw = w_lookup.reindex(pd.MultiIndex.from_arrays([links['year'], links['to']])).fillna(0.0).to_numpy()
+        need = links['weight'].isna().to_numpy()
+        tw = np.where(need, tw, 0.0)
+        tot = pd.Series(tw).groupby(links['src_row'].to_numpy()).transform('sum').to_numpy()
+        n_t = links.groupby('src_row')['to'].transform('size').to_numpy()
+        share = np.where(tot > 0, tw / np.where(tot > 0, tot, 1.0), 1.0 / n_t)
+        links.loc[need, 'weight'] = share[need]
+
+    # target county-years
+    tgt_key = pd.MultiIndex.from_arrays([links['year'], links['to']])
+    tgt_codes, tgt_index = pd.factorize(tgt_key)
+    M = sparse.csr_matrix((links['weight'].to_numpy(float), (tgt_codes, links['src_row'].to_numpy())),
+                          shape=(len(tgt_index), len(counties)))
+
+    # stack [X, X*w, observed, w*observed] and apply M once for all variables and years
+    Xv = X.to_numpy(float)
+    obs = np.isfinite(Xv)
+    X0 = np.where(obs, Xv, 0.0)
+    w = w_all.to_numpy(float)[:, None]
+    k = len(value_cols)
+    Y = M @ np.hstack([X0, X0 * w, obs.astype(float), obs * w])
+    total, wtotal, seen, wseen = Y[:, :k], Y[:, k:2*k], Y[:, 2*k:3*k], Y[:, 3*k:]
+
+    per_farm = np.array([c.endswith('_pf') for c in value_cols])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = np.where(per_farm, np.where(wseen > 0, wtotal / wseen, total / np.maximum(seen, 1e-12)), total)
+    out = np.where(seen > 0, out, np.nan)
+
+    # identifiers for target rows: latest row with that FIPS, else its first source row
+    meta_cols = [c for c in counties.columns if c not in value_cols and c != 'year']
+    latest = counties.sort_values('year').drop_duplicates('fips', keep='last').set_index('fips')
+    first_src = links.groupby(tgt_codes)['src_row'].first().to_numpy()
+    tgt_fips = tgt_index.get_level_values(1)
+    meta = latest.reindex(tgt_fips)[[c for c in meta_cols if c != 'fips']].reset_index(drop=True)
+    fallback = counties.iloc[first_src][[c for c in meta_cols if c != 'fips']].reset_index(drop=True)
+    meta = meta.fillna(fallback)
+
+    rebuilt = meta.assign(year=tgt_index.get_level_values(0).to_numpy(),
+                          fips=pd.array(tgt_fips.to_numpy(), dtype='Int64'))
+    rebuilt = pd.concat([rebuilt, pd.DataFrame(out, columns=value_cols)], axis=1)
+
+    n_moved = int(mapped.sum())
+    logger.info(f"Harmonized county FIPS: {n_moved} source county-years reallocated, "
+                f"{len(counties)} -> {len(rebuilt)} county rows")
+    return pd.concat([rebuilt[df.columns], rest], ignore_index=True)
 
 
 def process_nass_census_data(df, year):
@@ -842,13 +1227,13 @@ def process_nass_census_data(df, year):
         keep_cols = ['year','name','level','fips','statefip','counfip'] + [c for c in VARIABLE_MAPPING.keys() if c in result.columns]
         logger.info(f"NASS {year} processed rows: {len(result)} | cols: {len(keep_cols)}")
         logger.info(result[keep_cols].head().to_string())
-        result = result[keep_cols]
+        result = compact_panel(result[keep_cols].copy())
     return result
 
 
-def load_deflator_data():
+def load_deflator_data(deflator_path=DEFLATOR_FILE):
     """Load the BEA price deflator (A191RG) and return year + price_deflator."""
-    deflator_path = Path("/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/deflator/price_index_A191RG_BEA.csv")
+    deflator_path = Path(deflator_path)
     if not deflator_path.exists():
         logger.error(f"Deflator file not found: {deflator_path}")
         return None
@@ -886,13 +1271,7 @@ def deflate_columns(df, deflator_df, variable_mapping: dict):
     # compute real columns
     for col in deflatable_cols:
         if col in df_with_deflator.columns:
-            df_with_deflator[col] = (
-                df_with_deflator[col]
-                .astype(str)
-                .str.replace(r'[^\d\.\-]', '', regex=True)
-                .replace('', np.nan)
-                .astype(float)
-            )
+            df_with_deflator[col] = _as_number(df_with_deflator[col])
             real_col = f"{col}_real"
             df_with_deflator[real_col] = df_with_deflator[col] * (100 / df_with_deflator['price_deflator'])
             logger.info(f"Created deflated column: {real_col}")
@@ -921,13 +1300,16 @@ def get_icpsr_variable_mapping(year):
         base_mapping['counfip'] = 'cofips'
     return base_mapping
 
-def filter_and_process_data(file_path, year, variable_mapping, full_variable_specs=VARIABLE_MAPPING):
+def filter_and_process_data(file_path, year, variable_mapping, full_variable_specs=VARIABLE_MAPPING, member=None):
     """Select variables by mapping and attach year column (ICPSR files).
        Also: scale ICPSR 'in thousands' fields to dollars immediately.
+       `file_path` may be compressed (.gz/.zst) or a .zip with the year file as `member`;
+       only the mapped columns are parsed.
     """
     try:
-        df = pd.read_csv(file_path, sep='\t', low_memory=False)
-        logger.info(f"Loaded {len(df)} rows from {file_path}")
+        wanted = {v.strip().lower() for v in variable_mapping.values() if isinstance(v, str) and v.strip()}
+        df = read_raw_table(file_path, member=member, usecols=lambda c: c.lower() in wanted)
+        logger.info(f"Loaded {len(df)} rows from {file_path}" + (f" [{member}]" if member else ""))
 
         # map of lowercase -> actual column name in file
         df_columns_lower = {col.lower(): col for col in df.columns}
@@ -984,66 +1366,79 @@ def filter_and_process_data(file_path, year, variable_mapping, full_variable_spe
                             f"({before_nonnull} non-missing values).")
             # If not in_thousands but numeric-like, we leave as-is to avoid surprising changes.
 
-        return df_filtered
+        return compact_panel(df_filtered)
 
     except Exception as e:
         logger.error(f"Error processing {file_path}: {e}")
         return None
 
 
-def collect_census_files():
-    """Process ICPSR (1992–2012) files and write merged outputs for those years."""
-    base_path = Path("/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/ICPSR_1850-2012")
-    folder_year_mapping = {"DS0042": 1992, "DS0043": 1997, "DS0044": 2002, "DS0045": 2007, "DS0047": 2012}
-    folder_file_mapping = {"DS0042": "0042", "DS0043": "0043", "DS0044": "0044", "DS0045": "0045", "DS0047": "0047"}
+def _icpsr_source(base_path: Path, folder: str, icpsr_zip=ICPSR_ZIP):
+    """(path, zip member or None) for one ICPSR year: unpacked/compressed file first, then the study zip."""
+    name = f"35206-{folder[2:]}-Data.tsv"
+    source = resolve_raw_input(base_path / folder / name)
+    if source is not None:
+        return source, None
+    if icpsr_zip and Path(icpsr_zip).exists():
+        with zipfile.ZipFile(icpsr_zip) as zf:
+            member = next((n for n in zf.namelist() if n.endswith(f"{folder}/{name}")), None)
+        if member:
+            return Path(icpsr_zip), member
+    return None, None
 
-    # deflator
-    deflator_df = load_deflator_data()
-    if deflator_df is None:
-        logger.error("Failed to load deflator data. Exiting.")
-        return [], [{'error': 'Failed to load deflator data'}]
-
-    interim_dir = setup_directories()
 
-    collected_files, missing_files, processed_dataframes = [], [], []
+def collect_census_files(icpsr_dir=ICPSR_DIR, folders: dict = ICPSR_FOLDERS, interim_dir=None, write=None,
+                         icpsr_zip=ICPSR_ZIP):
+    """
+    Filter the ICPSR (1992–2012) year files. Returns (frames, collected_files,
+    missing_files); frames stay in memory. If `interim_dir` is given, each year
+    is also saved to {interim_dir}/{year}/census_{year}_filtered.tsv through
+    `write(df, path)` (default: a blocking write_frame; pass
+    BackgroundWriter.submit to write in the background).
+    """
+    base_path = Path(icpsr_dir)
+    write = write or write_frame
+    collected_files, missing_files, frames = [], [], []
 
-    for folder, year in folder_year_mapping.items():
+    for folder, year in folders.items():
         logger.info(f"Processing {folder} (Year: {year})")
-        file_number = folder_file_mapping[folder]
-        source_file = base_path / folder / f"35206-{file_number}-Data.tsv"
+        source_file, member = _icpsr_source(base_path, folder, icpsr_zip)
 
-        if not source_file.exists():
-            logger.warning(f"✗ File not found: {source_file}")
+        if source_file is None:
+            logger.warning(f"✗ File not found: {base_path / folder} (or in {icpsr_zip})")
             missing_files.append({'folder': folder, 'year': year, 'error': 'File not found'})
             continue
 
         try:
             variable_mapping = get_icpsr_variable_mapping(year)
-            df_filtered = filter_and_process_data(source_file, year, variable_mapping, full_variable_specs=VARIABLE_MAPPING)
+            df_filtered = filter_and_process_data(source_file, year, variable_mapping,
+                                                  full_variable_specs=VARIABLE_MAPPING, member=member)
             if df_filtered is None:
                 missing_files.append({'folder': folder, 'year': year, 'error': 'Failed to process data'})
                 continue
+            frames.append(df_filtered)
 
-            year_file = interim_dir / str(year) / f"census_{year}_filtered.tsv"
-            df_filtered.to_csv(year_file, sep='\t', index=False)
-            processed_dataframes.append(df_filtered)
+            year_file = None
+            if interim_dir is not None:
+                year_file = output_path(Path(interim_dir) / str(year) / f"census_{year}_filtered.tsv", OUTPUT_CODEC)
+                write(df_filtered, year_file)
 
             collected_files.append({
                 'year': year,
                 'folder': folder,
-                'source': str(source_file),
-                'destination': str(year_file),
+                'source': f"{source_file}:{member}" if member else str(source_file),
+                'destination': str(year_file) if year_file else 'memory',
                 'rows': len(df_filtered),
                 'columns': len(df_filtered.columns)
             })
-            logger.info(f"✓ Processed {source_file.name} → {year_file.name} ({len(df_filtered)} rows, {len(df_filtered.columns)} cols)")
+            logger.info(f"✓ Processed {source_file.name} ({len(df_filtered)} rows, {len(df_filtered.columns)} cols)")
         except Exception as e:
             logger.error(f"✗ Failed to process {source_file}: {e}")
             missing_files.append({'folder': folder, 'year': year, 'error': str(e)})
 
-    return collected_files, missing_files
+    return frames, collected_files, missing_files
 
-def print_summary(collected_files, missing_files):
+def print_summary(collected_files, missing_files, interim_dir=INTERIM_DIR):
     """Print a summary of the collection process."""
     print("\n" + "="*80)
     print("AGRICULTURAL CENSUS DATA PROCESSING SUMMARY")
@@ -1068,26 +1463,37 @@ def print_summary(collected_files, missing_files):
         for file_info in missing_files:
             print(f"  {file_info['year']} ({file_info['folder']}): {file_info['error']}")
 
-    print(f"\nOutput directory: /Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/interim")
+    print(f"\nOutput directory: {interim_dir}")
     print("="*80)
 
-def process_nass_data():
-    """Process NASS 2017 & 2022 and convert to ICPSR-like format."""
-    processed = []
-
-    df_2017 = load_nass_census_data(NASS_2017_FILE, 2017)
-    if df_2017 is not None:
-        p2017 = process_nass_census_data(df_2017, 2017)
-        if p2017 is not None:
-            processed.append(p2017)
-
-    df_2022 = load_nass_census_data(NASS_2022_FILE, 2022)
-    if df_2022 is not None:
-        p2022 = process_nass_census_data(df_2022, 2022)
-        if p2022 is not None:
-            processed.append(p2022)
-
-    return processed
+def process_nass_data(nass_files: dict = NASS_FILES, interim_dir=None, write=None):
+    """
+    Process NASS years (2017, 2022, ...) into ICPSR-like frames. Same return
+    value and optional interim side output as collect_census_files.
+    """
+    write = write or write_frame
+    frames, collected_files, missing_files = [], [], []
+    for year, path in nass_files.items():
+        raw = load_nass_census_data(path, year)
+        p = process_nass_census_data(raw, year) if raw is not None else None
+        if p is None or p.empty:
+            missing_files.append({'folder': 'NASS', 'year': year, 'error': 'Failed to process data'})
+            continue
+        frames.append(p)
+
+        year_file = None
+        if interim_dir is not None:
+            year_file = output_path(Path(interim_dir) / str(year) / f"census_{year}_filtered.tsv", OUTPUT_CODEC)
+            write(p, year_file)
+        collected_files.append({
+            'year': year,
+            'folder': 'NASS',
+            'source': str(path),
+            'destination': str(year_file) if year_file else 'memory',
+            'rows': len(p),
+            'columns': len(p.columns)
+        })
+    return frames, collected_files, missing_files
 
 
 def apply_manual_calculations(df: pd.DataFrame, calcs: list) -> pd.DataFrame:
@@ -1151,122 +1557,589 @@ def apply_manual_calculations(df: pd.DataFrame, calcs: list) -> pd.DataFrame:
     return out
 
 
-def main():
-    """Main orchestrator."""
-    logger.info("Starting agricultural census data collection...")
+def apply_panel_calculations(df: pd.DataFrame, calcs: list, history: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Apply PANEL_CALCS window operations (lag, growth, share_of_state,
+    share_of_national). Lags look up the row for year - k * CENSUS_INTERVAL and
+    shares the parent row, both by the (year, level, fips) key, so every op is
+    linear in rows and a county missing one census gets NaN, not a 10-year lag.
+    `history` holds earlier years' rows that only feed lags (e.g. the previous
+    partition when a single year is ingested); they are not returned.
+    """
+    out = df.copy()
+    n = len(out)
+    parts = [out] if history is None else [out, history]
+
+    def ids(col):
+        return np.concatenate([pd.to_numeric(p[col], errors='coerce').to_numpy('float64', na_value=np.nan)
+                               for p in parts])
+
+    def column(col):
+        return np.concatenate([pd.to_numeric(p[col], errors='coerce').to_numpy('float64', na_value=np.nan)
+                               if col in p.columns else np.full(len(p), np.nan) for p in parts])
+
+    lvl = np.nan_to_num(ids('level'), nan=-1).astype('int64')
+    fips = np.nan_to_num(ids('fips'), nan=-1).astype('int64')
+    year = np.nan_to_num(ids('year'), nan=-1).astype('int64')
+
+    # (year, level, fips) -> first row, for lag and parent lookups
+    key = (year * 10 + lvl) * 100_000 + fips
+    row_of = pd.Series(np.arange(len(key)), index=key)
+    row_of = row_of[~row_of.index.duplicated()]
+
+    def lag_of(x, k):
+        pos = row_of.index.get_indexer(((year - k * CENSUS_INTERVAL) * 10 + lvl) * 100_000 + fips)
+        ok = (pos >= 0) & (fips >= 0) & (year >= 0)
+        return np.where(ok, x[np.where(ok, pos, 0)], np.nan)[:n]
+
+    def share_of(x, child, parent_level, parent_fips):
+        pos = row_of.index.get_indexer((year * 10 + parent_level) * 100_000 + parent_fips)
+        ok = child & (pos >= 0)
+        parent = np.where(ok, x[np.where(pos >= 0, pos, 0)], np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(ok & (parent != 0), x / parent, np.nan)[:n]
 
-    interim_dir = setup_directories()
+    for spec in calcs or []:
+        name, op, col = spec.get("name"), (spec.get("op") or "").strip().lower(), spec.get("input")
+        if not name or not col or op not in {"lag", "growth", "share_of_state", "share_of_national"}:
+            logger.warning(f"Skipping panel calc with invalid spec: {spec}")
+            continue
+        if col not in out.columns:
+            logger.warning(f"Panel calc '{name}': missing input column '{col}'. Filling with NaN.")
+        x = column(col)
+
+        if op in {"lag", "growth"}:
+            lag = lag_of(x, int(spec.get("periods", 1)))
+            if op == "lag":
+                res = lag
+            else:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    res = np.where(lag != 0, x[:n] / lag - 1.0, np.nan)
+        elif op == "share_of_state":
+            res = share_of(x, lvl == 1, 2, fips // 1000)
+        else:
+            res = share_of(x, (lvl == 1) | (lvl == 2), 3, 99000)
 
-    # Load deflator once
-    deflator_df = load_deflator_data()
+        out[name] = res
+    return out
+
+
+def validate_totals(df: pd.DataFrame,
+                    variables: list = ADDITIVE_VARS,
+                    tol: float = TOTALS_TOLERANCE) -> pd.DataFrame:
+    """
+    Compare children sums with reported totals for every additive variable and
+    year in one grouped pass: counties -> their state (fips // 1000), states -> US (99000).
+    Returns one row per (year, level, fips, variable) with child_sum, reported,
+    n_missing (suppressed/NaN children), rel_diff and a fail flag.
+    """
+    vars_ = [v for v in variables if v in df.columns]
+    lvl = pd.to_numeric(df['level'], errors='coerce')
+    fips = pd.to_numeric(df['fips'], errors='coerce')
+    vals = df[vars_].apply(pd.to_numeric, errors='coerce').astype('float64')
+
+    # children keyed by their parent's (year, level, fips)
+    is_child = lvl.isin([1, 2])
+    parent = pd.Series(np.where(lvl == 1, fips // 1000, 99000), index=df.index)
+    keys = [df['year'][is_child], (lvl + 1)[is_child], parent[is_child]]
+    grp_vals = vals[is_child].groupby(keys)
+    sums = grp_vals.sum(min_count=1)
+    missing = vals[is_child].isna().groupby(keys).sum()
+    sums.index.names = missing.index.names = ['year', 'level', 'fips']
+
+    is_total = lvl.isin([2, 3])
+    reported = (vals[is_total].groupby([df['year'][is_total], lvl[is_total], fips[is_total]]).first())
+    reported.index.names = ['year', 'level', 'fips']
+    reported = reported.reindex(sums.index)
+
+    k = len(vars_)
+    idx = sums.index
+    out = pd.DataFrame({
+        'year': np.repeat(idx.get_level_values('year'), k),
+        'level': np.repeat(idx.get_level_values('level'), k),
+        'fips': np.repeat(idx.get_level_values('fips'), k),
+        'variable': np.tile(vars_, len(idx)),
+        'child_sum': sums.to_numpy(float).ravel(),
+        'reported': reported.to_numpy(float).ravel(),
+        'n_missing': missing.reindex(idx).to_numpy().ravel(),
+    })
+    out = out[out['child_sum'].notna() & out['reported'].notna()]
+    out['diff'] = out['child_sum'] - out['reported']
+    out['rel_diff'] = out['diff'] / out['reported'].abs().replace(0, np.nan)
+    rel = out['rel_diff'].fillna(np.sign(out['diff']) * np.inf)
+    out['fail'] = (rel > tol) | ((out['n_missing'] == 0) & (rel.abs() > tol))
+    return out[out['diff'] != 0].reset_index(drop=True)
+
+
+def impute_suppressed(df: pd.DataFrame,
+                      variables: list = IMPUTE_VARS,
+                      proxy: str = IMPUTE_PROXY,
+                      proxy_overrides: dict = IMPUTE_PROXY_OVERRIDES) -> pd.DataFrame:
+    """
+    Fill withheld county values from state residuals, for all variables at once:
+      residual = max(state total - sum of disclosed counties, 0)
+      imputed  = residual * proxy / sum(proxy over the state's suppressed counties)
+    (equal split when the proxy is missing for all of them). All steps are
+    grouped transforms over (year, state). Counties in states without a reported
+    total stay NaN. Non-county rows get their reported value and flag 0.
+    """
+    vars_ = [v for v in variables if v in df.columns]
+    if not vars_:
+        return df
+    out = df.copy()
+    lvl = pd.to_numeric(out['level'], errors='coerce')
+    fips = pd.to_numeric(out['fips'], errors='coerce')
+    vals = out[vars_].apply(pd.to_numeric, errors='coerce').astype('float64')
+
+    is_county = (lvl == 1) & fips.notna()
+    V = vals[is_county]
+    keys = [out.loc[is_county, 'year'], (fips[is_county] // 1000).rename('state')]
+
+    # state totals aligned to county rows
+    is_state = lvl == 2
+    totals = vals[is_state].groupby([out.loc[is_state, 'year'], fips[is_state].rename('state')]).first()
+    T = totals.reindex(pd.MultiIndex.from_arrays(keys)).set_axis(V.index)
+
+    suppressed = V.isna()
+    residual = (T - V.groupby(keys).transform('sum')).clip(lower=0)
+
+    # proxy matrix: one proxy column per variable
+    proxy_cols = [proxy_overrides.get(v.removesuffix('_real'), proxy) for v in vars_]
+    P = pd.DataFrame({v: (pd.to_numeric(out.loc[is_county, p], errors='coerce')
+                          if p in out.columns else np.nan)
+                      for v, p in zip(vars_, proxy_cols)}, index=V.index)
+    P = P.where(suppressed, 0.0).fillna(0.0)
+    p_sum = P.groupby(keys).transform('sum')
+    n_sup = suppressed.groupby(keys).transform('sum')
+    share = (P / p_sum).where(p_sum > 0, suppressed / n_sup.where(n_sup > 0))
+
+    imputed = V.where(~suppressed, residual * share)
+    flag = (suppressed & imputed.notna()).astype(int)
+
+    imp_all = vals.copy()
+    imp_all.loc[is_county] = imputed
+    flag_all = pd.DataFrame(0, index=out.index, columns=vars_)
+    flag_all.loc[is_county] = flag
+    for v in vars_:
+        out[f"{v}_imp"] = imp_all[v]
+        out[f"{v}_imp_flag"] = flag_all[v]
+    n_imp = int(flag.to_numpy().sum())
+    logger.info(f"Imputed {n_imp} suppressed county values across {len(vars_)} variables")
+    return out
+
+
+def build_derived_panel(merged_df: pd.DataFrame, deflator_df: pd.DataFrame, interim_dir: Path,
+                        history: pd.DataFrame = None):
+    """
+    Everything after the raw years are stacked: FIPS + names, county harmonization,
+    deflation, manual calcs, panel window calcs, totals validation and imputation.
+    Works on any set of years (the full build or a single ingested year, with
+    `history` supplying the previous census for lags). Returns None if the
+    totals check fails; main() and ingest_year() then report failure and the
+    command exits with status 1.
+    """
+    merged_df = normalize_fips_after_merge(merged_df) 
+    merged_df = standardize_geo_names(merged_df)
+    if HARMONIZE_COUNTIES:
+        merged_df = harmonize_county_fips(merged_df)
+
+    # Deflate
+    logger.info("Applying deflation...")
+    merged_df_deflated = deflate_columns(merged_df, deflator_df, VARIABLE_MAPPING)
+
+    # Build any manual calculated columns (post-deflation)
+    merged_df_deflated = apply_manual_calculations(merged_df_deflated, MANUAL_CALCS)
+
+    # Lags, growth rates and within-level shares
+    merged_df_deflated = apply_panel_calculations(merged_df_deflated, PANEL_CALCS, history=history)
+
+    # Check county -> state -> national totals before writing anything
+    if VALIDATE_TOTALS:
+        logger.info("Validating county/state/national totals...")
+        discrepancies = validate_totals(merged_df_deflated)
+        years = "_".join(str(int(y)) for y in sorted(merged_df_deflated['year'].dropna().unique()))
+        disc_file = interim_dir / (f"validation_totals_discrepancies_{years}.tsv"
+                                   if merged_df_deflated['year'].nunique() == 1
+                                   else "validation_totals_discrepancies.tsv")
+        discrepancies.to_csv(disc_file, sep='\t', index=False)
+        n_fail = int(discrepancies['fail'].sum())
+        logger.info(f"Totals check: {len(discrepancies)} discrepancies, {n_fail} over tolerance → {disc_file}")
+        if n_fail:
+            worst = discrepancies[discrepancies['fail']].sort_values('rel_diff', key=abs, ascending=False)
+            logger.error("Totals check failed (tolerance %.3f):\n%s", TOTALS_TOLERANCE, worst.head(20).to_string())
+            return None
+
+    # Fill suppressed county values from state residuals
+    if IMPUTE_SUPPRESSED:
+        merged_df_deflated = impute_suppressed(merged_df_deflated)
+    return compact_panel(merged_df_deflated)
+
+
+def _mapping_comments() -> dict:
+    """Inline comments on the VARIABLE_MAPPING entries in this file (`'crop_acres': {   #total cropland`)."""
+    text = Path(__file__).read_text(encoding='utf-8')
+    found = re.finditer(r"^\s*'(\w+)':\s*\{\s*#\s*(.*?)\s*$", text, re.M)
+    return {m.group(1): m.group(2) for m in found if m.group(1) in VARIABLE_MAPPING and m.group(2)}
+
+
+def panel_variable_labels(columns) -> dict:
+    """Stata variable labels (<= 80 chars) for the panel's columns."""
+    comments = _mapping_comments()
+    base = {
+        'year': 'Census year',
+        'name': 'County or state name',
+        'level': 'Geography level',
+        'fips': 'FIPS code (state: 1-2 digits, county: 4-5 digits, US: 99000)',
+        'statefip': 'State FIPS',
+        'counfip': 'County FIPS within state',
+        'price_deflator': 'BEA GDP price index A191RG (2017=100)',
+    }
+    for var, cfg in VARIABLE_MAPPING.items():
+        short = (cfg.get('nass_short_desc') or '').strip()
+        note = comments.get(var, '')
+        base[var] = f"{short} ({note})" if short and note else (short or note or var)
+    for spec in MANUAL_CALCS:
+        base[spec['name']] = f"{spec['op']}({', '.join(spec['inputs'])})"
+    op_text = {'lag': 'previous census', 'growth': 'growth since previous census',
+               'share_of_state': 'share of state total', 'share_of_national': 'share of US total'}
+    for spec in PANEL_CALCS:
+        base[spec['name']] = f"{spec['input']}: {op_text.get(spec['op'], spec['op'])}"
+
+    def label(col):
+        if col in base:
+            return base[col]
+        if col.endswith('_imp_flag'):
+            return f"{col[:-len('_imp_flag')]} imputed from state residual"
+        if col.endswith('_imp'):
+            return f"Imputed: {label(col[:-len('_imp')])}"
+        if col.endswith('_real'):
+            # the mapping comments describe the nominal series; prefer the NASS description
+            nominal = col[:-len('_real')]
+            short = (VARIABLE_MAPPING.get(nominal, {}).get('nass_short_desc') or '').strip()
+            return f"Real 2017 $: {short or label(nominal)}"
+        return ''
+    return {c: label(c)[:80] for c in columns}
+
+
+def select_deflated_columns(merged_df_deflated: pd.DataFrame) -> pd.DataFrame:
+    """Deflated dataset: identifiers, non-monetary columns, then *_real (no nominal $, no deflator)."""
+    essential_columns = ['year', 'name', 'level', 'fips', 'statefip', 'counfip']
+    deflatable_vars = {
+        name for name, cfg in VARIABLE_MAPPING.items()
+        if isinstance(cfg, dict) and cfg.get('deflate')
+    }
+    real_columns = [c for c in merged_df_deflated.columns if c.endswith('_real')]
+    # Exclude price_deflator from deflated dataset
+    other_columns = [col for col in merged_df_deflated.columns
+                     if col not in essential_columns
+                     and not col.endswith('_real')
+                     and col not in deflatable_vars
+                     and col != 'price_deflator']
+    final_columns = [c for c in (essential_columns + other_columns + real_columns)
+                     if c in merged_df_deflated.columns]
+    return merged_df_deflated[final_columns].copy()
+
+
+# -----------------------------------
+# Per-year partitions
+# -----------------------------------
+def read_manifest(panel_dir: Path) -> dict:
+    path = Path(panel_dir) / "manifest.json"
+    if not path.exists():
+        return {'columns': [], 'partitions': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(panel_dir: Path, manifest: dict):
+    path = Path(panel_dir) / "manifest.json"
+    tmp = path.with_suffix(".json.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, path)
+
+
+def write_partition(df_year: pd.DataFrame, panel_dir: Path, year: int, manifest: dict, write=None):
+    """
+    Write one year's rows (temp file + rename, via `write`, default write_frame)
+    and record it in `manifest`. Returns whatever `write` returns.
+    """
+    out = output_path(Path(panel_dir) / f"year={int(year)}.tsv", OUTPUT_CODEC)
+    done = (write or write_frame)(df_year, out)
+    manifest['partitions'][str(int(year))] = {'file': out.name, 'rows': len(df_year),
+                                               'columns': len(df_year.columns)}
+    manifest['columns'] = list(dict.fromkeys(manifest.get('columns', []) + list(df_year.columns)))
+    return done
+
+
+def write_partitions(final_df: pd.DataFrame, panel_dir: Path, write=None) -> dict:
+    """Full build: one partition per year, then the manifest once they are all on disk."""
+    manifest = {'columns': list(final_df.columns), 'partitions': {}}
+    pending = [write_partition(df_year, panel_dir, year, manifest, write)
+               for year, df_year in final_df.groupby('year', sort=True)]
+    for done in pending:
+        if hasattr(done, 'result'):
+            done.result()
+    _write_manifest(panel_dir, manifest)
+    return manifest
+
+
+def load_panel_partitions(panel_dir=None, years=None, columns=None) -> pd.DataFrame:
+    """Read the partitioned panel (all years in the manifest, or `years`; all columns, or `columns`)."""
+    panel_dir = Path(panel_dir or Path(INTERIM_DIR) / PANEL_DIR_NAME)
+    manifest = read_manifest(panel_dir)
+    keep = {str(int(y)) for y in years} if years is not None else None
+    cols = manifest['columns'] if columns is None else [c for c in manifest['columns'] if c in set(columns)]
+    usecols = None if columns is None else (lambda c: c in set(cols))
+    frames = [read_panel_tsv(panel_dir / part['file'], usecols=usecols)
+              for y, part in sorted(manifest['partitions'].items())
+              if keep is None or y in keep]
+    if not frames:
+        return pd.DataFrame(columns=cols)
+    return compact_panel(pd.concat(frames, ignore_index=True).reindex(columns=cols))
+
+
+def ingest_year(year: int,
+                nass_file: str,
+                replace: bool = False,
+                interim_dir=INTERIM_DIR,
+                deflator_path=DEFLATOR_FILE) -> bool:
+    """
+    Process a single new NASS census file through the full derived-column
+    pipeline and append it as a partition. Existing partitions are never
+    rewritten, but they are re-read: first the key and lag/growth input
+    columns of the censuses the lags point at, then every partition in full to
+    regenerate the merged outputs (deflated TSV, .dta, hashes, cube) so
+    downstream scripts see the new year. FULL_FILE (nominal + deflator) has no
+    partitions and is left as is, i.e. without the new year.
+    """
+    interim_dir = setup_directories([year], interim_dir=interim_dir)
+    panel_dir = interim_dir / PANEL_DIR_NAME
+    manifest = read_manifest(panel_dir)
+    if str(year) in manifest['partitions'] and not replace:
+        logger.error(f"Year {year} already in {panel_dir / 'manifest.json'}; use --replace to overwrite.")
+        return False
+
+    deflator_df = load_deflator_data(deflator_path)
     if deflator_df is None:
         logger.error("Failed to load deflator data. Exiting.")
-        return
-
+        return False
+    if year not in set(deflator_df['year']):
+        logger.warning(f"No deflator for {year}; *_real columns will be NaN.")
+
+    raw = load_nass_census_data(nass_file, year)
+    if raw is None:
+        return False
+    processed = process_nass_census_data(raw, year)
+    if processed is None or processed.empty:
+        logger.error(f"No usable rows in {nass_file}")
+        return False
+
+    # the censuses the lags point at feed lags/growth only: keys + their inputs
+    history = None
+    window = [c for c in PANEL_CALCS if c.get("op") in {"lag", "growth"}]
+    lag_years = {year - int(c.get("periods", 1)) * CENSUS_INTERVAL for c in window}
+    earlier = [int(y) for y in manifest['partitions'] if int(y) in lag_years]
+    if earlier:
+        history = load_panel_partitions(panel_dir, years=earlier,
+                                        columns=['year', 'level', 'fips'] + [c['input'] for c in window])
+
+    derived = build_derived_panel(processed, deflator_df, interim_dir, history=history)
+    if derived is None:
+        return False
+    final_df = select_deflated_columns(derived)
+
+    # keep the panel's column order; new columns are appended (and logged)
+    new_cols = [c for c in final_df.columns if c not in manifest['columns']]
+    if manifest['columns'] and new_cols:
+        logger.warning(f"{year} adds columns not in earlier partitions: {new_cols}")
+    final_df = final_df.reindex(columns=list(dict.fromkeys(manifest['columns'] + list(final_df.columns))))
+
+    out = write_partition(final_df, panel_dir, year, manifest)
+    _write_manifest(panel_dir, manifest)
+    logger.info(f"✓ Ingested {year}: {out} ({len(final_df)} rows)")
+
+    # every consumer reads the merged file, so rebuild it from the partitions
+    panel = load_panel_partitions(panel_dir)
+    final_file = output_path(interim_dir / DEFLATED_FILE, OUTPUT_CODEC)
+    write_merged_outputs(panel, interim_dir, final_file)
+    logger.info(f"✓ Rebuilt {final_file} from {len(manifest['partitions'])} partitions ({len(panel)} rows)")
+    full_file = output_path(interim_dir / FULL_FILE, OUTPUT_CODEC)
+    if full_file.exists():
+        logger.warning(f"{full_file} (nominal + deflator) is not rebuilt by ingest-year and "
+                       f"now lacks {year}; run a full build to refresh it.")
+    return True
+
+
+def write_merged_outputs(final_df: pd.DataFrame, interim_dir: Path, final_file: Path, write=None):
+    """
+    Outputs derived from the deflated panel that downstream scripts read: the
+    merged TSV (through `write`, default write_frame), the labeled .dta, the
+    memory report, the hash manifest and the county cube. The previous hash
+    manifest (and, with KEEP_PREVIOUS_SNAPSHOT, the file it describes) is kept
+    as *.prev.* for panel_diff.py.
+    """
+    hash_file = interim_dir / HASH_MANIFEST_FILE
+    prev_file = hash_file.with_name(hash_file.name.replace('.json', '.prev.json'))
+    rotate_manifest(hash_file, snapshot=KEEP_PREVIOUS_SNAPSHOT)   # before final_file is overwritten
+    (write or write_frame)(final_df, final_file)
+
+    if WRITE_STATA:
+        flags = {c: {0: "reported", 1: "imputed"} for c in final_df.columns if c.endswith('_imp_flag')}
+        years = pd.to_numeric(final_df['year'], errors='coerce')
+        dta = write_dta(final_df, interim_dir / STATA_FILE,
+                        variable_labels=panel_variable_labels(final_df.columns),
+                        value_labels={'level': LEVEL_LABELS, **flags},
+                        data_label=f"Agricultural Census panel {int(years.min())}-{int(years.max())} (real 2017 $)")
+        logger.info(f"✓ Wrote labeled Stata file: {dta}")
+
+    report = memory_report(final_df)
+    report.to_csv(interim_dir / MEMORY_REPORT_FILE, sep='\t', index=False)
+    tot = report.iloc[-1]
+    logger.info(f"Deflated panel in memory: {tot['bytes'] / 2**20:.1f} MiB "
+                f"(float64/object: {tot['bytes_untyped'] / 2**20:.1f} MiB) → {interim_dir / MEMORY_REPORT_FILE}")
+
+    hashes = write_hash_manifest(final_df, hash_file, source=final_file)
+    if prev_file.exists():
+        blocks = compare_manifests(json.loads(prev_file.read_text()), hashes)
+        if blocks.empty:
+            logger.info("Deflated panel unchanged since the previous run")
+        else:
+            logger.info(f"{len(blocks)} (column, year) blocks changed since the previous run "
+                        f"({blocks['column'].nunique()} columns); details: "
+                        f"python panel_diff.py {prev_file} {hash_file}")
+
+    if WRITE_PANEL_CUBE:
+        cube_dir = write_panel_cube(final_df, interim_dir / "panel_cube")
+        logger.info(f"✓ Wrote memory-mapped county cube: {cube_dir}")
+
+
+def build_panel(deflator_df: pd.DataFrame,
+                interim_dir: Path,
+                icpsr_dir=ICPSR_DIR,
+                icpsr_folders: dict = ICPSR_FOLDERS,
+                nass_files: dict = NASS_FILES,
+                side_dir=None,
+                write=None):
+    """
+    Steps 1-4 in memory: filter every ICPSR and NASS year, stack them and build
+    the derived panel. Returns (merged_df_deflated or None, collected_files,
+    missing_files). `interim_dir` receives the validation report; `side_dir`,
+    if given, the per-year filtered TSVs (through `write`).
+    """
     # Step 1: ICPSR 1992–2012
     logger.info("Step 1: Processing ICPSR census data (1992–2012)...")
-    icpsr_files, icpsr_missing = collect_census_files()
+    icpsr_frames, collected_files, missing_files = collect_census_files(
+        icpsr_dir, icpsr_folders, interim_dir=side_dir, write=write)
 
     # Step 2: NASS 2017/2022
-    logger.info("Step 2: Processing NASS census data (2017, 2022)...")
-    processed_nass_data = process_nass_data()
-
-    # Step 3: Merge all years (if we have any NASS data)
-    if processed_nass_data:
-        logger.info("Step 3: Creating merged dataset (1992–2022)...")
-
-        # Load already-saved ICPSR per-year files
-        icpsr_data = []
-        for y in [1992, 1997, 2002, 2007, 2012]:
-            f = interim_dir / str(y) / f"census_{y}_filtered.tsv"
-            if f.exists():
-                icpsr_data.append(pd.read_csv(f, sep='\t', low_memory=False))
-
-        # Combine ICPSR + NASS
-        all_data = icpsr_data + processed_nass_data
-        merged_df = pd.concat(all_data, ignore_index=True)
-
-        merged_df = normalize_fips_after_merge(merged_df) 
-        merged_df = standardize_geo_names(merged_df)
-
-        # Deflate
-        logger.info("Step 4: Applying deflation (1992–2022)...")
-        merged_df_deflated = deflate_columns(merged_df, deflator_df, VARIABLE_MAPPING)
-
-        # Build any manual calculated columns (post-deflation)
-        merged_df_deflated = apply_manual_calculations(merged_df_deflated, MANUAL_CALCS)
-
-        # Build outputs
-        essential_columns = ['year', 'name', 'level', 'fips', 'statefip', 'counfip']
-        deflatable_vars = {
-            name for name, cfg in VARIABLE_MAPPING.items()
-            if isinstance(cfg, dict) and cfg.get('deflate')
-        }
-        real_columns = [c for c in merged_df_deflated.columns if c.endswith('_real')]
-        # Exclude price_deflator from deflated dataset
-        other_columns = [col for col in merged_df_deflated.columns
-                         if col not in essential_columns
-                         and not col.endswith('_real')
-                         and col not in deflatable_vars
-                         and col != 'price_deflator']
+    logger.info(f"Step 2: Processing NASS census data ({', '.join(map(str, nass_files))})...")
+    nass_frames, nass_collected, nass_missing = process_nass_data(nass_files, interim_dir=side_dir, write=write)
+    collected_files += nass_collected
+    missing_files += nass_missing
+
+    all_data = icpsr_frames + nass_frames
+    if not all_data:
+        return None, collected_files, missing_files
+
+    # Step 3: Combine ICPSR + NASS
+    logger.info("Step 3: Creating merged dataset (1992–2022)...")
+    merged_df = pd.concat(all_data, ignore_index=True)
+
+    # Step 4: FIPS/names, harmonization, deflation, manual calcs, checks, imputation
+    logger.info("Step 4: Building derived panel (1992–2022)...")
+    merged_df_deflated = build_derived_panel(merged_df, deflator_df, interim_dir)
+    return merged_df_deflated, collected_files, missing_files
+
+
+def main(interim_dir=INTERIM_DIR,
+         write_interim: bool = WRITE_INTERIM_FILES,
+         deflator_path=DEFLATOR_FILE,
+         icpsr_dir=ICPSR_DIR,
+         icpsr_folders: dict = ICPSR_FOLDERS,
+         nass_files: dict = NASS_FILES) -> bool:
+    """
+    Main orchestrator; every input and output location comes in as an argument.
+    Returns False if the build failed (no data, deflator or totals check).
+    """
+    logger.info("Starting agricultural census data collection...")
+
+    interim_dir = setup_directories(interim_dir=interim_dir)
+
+    # Load deflator once
+    deflator_df = load_deflator_data(deflator_path)
+    if deflator_df is None:
+        logger.error("Failed to load deflator data. Exiting.")
+        return False
+
+    final_file = output_path(interim_dir / DEFLATED_FILE, OUTPUT_CODEC)
+    full_file = output_path(interim_dir / FULL_FILE, OUTPUT_CODEC)
+
+    # every file output is queued; compute continues while earlier ones serialize
+    with BackgroundWriter(WRITER_WORKERS, processes=WRITER_PROCESSES) as writer:
+        merged_df_deflated, collected_files, missing_files = build_panel(
+            deflator_df, interim_dir,
+            icpsr_dir=icpsr_dir, icpsr_folders=icpsr_folders, nass_files=nass_files,
+            side_dir=interim_dir if write_interim else None,
+            write=writer.submit if write_interim else None)
+        if merged_df_deflated is None:
+            print_summary(collected_files, missing_files, interim_dir)
+            return False
 
         # Deflated dataset (NO deflator)
-        final_columns = [c for c in (essential_columns + other_columns + real_columns)
-                         if c in merged_df_deflated.columns]
-        final_df = merged_df_deflated[final_columns].copy()
+        final_df = select_deflated_columns(merged_df_deflated)
 
         # Full dataset (WITH deflator)
-        full_df = merged_df_deflated.copy()
+        full_df = merged_df_deflated
 
         # Save
-        final_file = interim_dir / "census_merged_1992_2022_deflated.tsv"
-        final_df.to_csv(final_file, sep='\t', index=False)
-
-        full_file = interim_dir / "census_merged_1992_2022_full.tsv"
-        full_df.to_csv(full_file, sep='\t', index=False)
-
-        logger.info(f"✓ Created deflated merged dataset: {final_file} ({len(final_df)} rows, {len(final_df.columns)} cols)")
-        logger.info(f"✓ Created full dataset (nominal + real + deflator): {full_file} ({len(full_df)} rows, {len(full_df.columns)} cols)")
-
-        # Extend summaries from earlier step
-        collected_files = icpsr_files + [
-            {
-                'year': 2017,
-                'folder': 'NASS',
-                'source': 'NASS_2017',
-                'destination': str(interim_dir / "2017" / "census_2017_filtered.tsv"),
-                'rows': len(processed_nass_data[0]) if processed_nass_data else 0,
-                'columns': len(processed_nass_data[0].columns) if processed_nass_data else 0
-            },
-            {
-                'year': 2022,
-                'folder': 'NASS',
-                'source': 'NASS_2022',
-                'destination': str(interim_dir / "2022" / "census_2022_filtered.tsv"),
-                'rows': len(processed_nass_data[1]) if len(processed_nass_data) > 1 else 0,
-                'columns': len(processed_nass_data[1].columns) if len(processed_nass_data) > 1 else 0
-            },
-            {
-                'year': 'merged_deflated',
-                'folder': 'all',
-                'source': 'multiple',
-                'destination': str(final_file),
-                'rows': len(final_df),
-                'columns': len(final_df.columns)
-            },
-            {
-                'year': 'merged_full',
-                'folder': 'all',
-                'source': 'multiple',
-                'destination': str(full_file),
-                'rows': len(full_df),
-                'columns': len(full_df.columns)
-            }
-        ]
-        print_summary(collected_files, icpsr_missing)
-    else:
-        # No NASS data processed; still print ICPSR-only summary
-        print_summary(icpsr_files, icpsr_missing)
+        writer.submit(full_df, full_file)
+        write_merged_outputs(final_df, interim_dir, final_file, write=writer.submit)
+
+        manifest = write_partitions(final_df, interim_dir / PANEL_DIR_NAME, write=writer.submit)
+        logger.info(f"✓ Wrote {len(manifest['partitions'])} year partitions: {interim_dir / PANEL_DIR_NAME}")
+
+    logger.info(f"✓ Created deflated merged dataset: {final_file} ({len(final_df)} rows, {len(final_df.columns)} cols)")
+    logger.info(f"✓ Created full dataset (nominal + real + deflator): {full_file} ({len(full_df)} rows, {len(full_df.columns)} cols)")
+
+    collected_files += [
+        {
+            'year': 'merged_deflated',
+            'folder': 'all',
+            'source': 'multiple',
+            'destination': str(final_file),
+            'rows': len(final_df),
+            'columns': len(final_df.columns)
+        },
+        {
+            'year': 'merged_full',
+            'folder': 'all',
+            'source': 'multiple',
+            'destination': str(full_file),
+            'rows': len(full_df),
+            'columns': len(full_df.columns)
+        }
+    ]
+    print_summary(collected_files, missing_files, interim_dir)
+    return True
 
 if __name__ == "__main__":
-    main()
+    import sys
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the merged Agricultural Census panel.")
+    parser.add_argument("--interim-dir", default=INTERIM_DIR, help="output directory (default: INTERIM_DIR)")
+    parser.add_argument("--deflator", default=DEFLATOR_FILE, help="deflator file (default: DEFLATOR_FILE)")
+    sub = parser.add_subparsers(dest="command")
+    p_ingest = sub.add_parser("ingest-year", help="Process one new NASS census file and append it as a year partition")
+    p_ingest.add_argument("year", type=int)
+    p_ingest.add_argument("nass_file")
+    p_ingest.add_argument("--replace", action="store_true", help="overwrite an existing partition for this year")
+    args = parser.parse_args()
+
+    if args.command == "ingest-year":
+        ok = ingest_year(args.year, args.nass_file, replace=args.replace,
+                         interim_dir=args.interim_dir, deflator_path=args.deflator)
+    else:
+        ok = main(interim_dir=args.interim_dir, deflator_path=args.deflator)
+    # a failed totals check (or missing inputs) must fail the run, not exit 0
+    sys.exit(0 if ok else 1)
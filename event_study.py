@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Farm-bill event studies on the county panel: corn exposure x event time, with
+county and year fixed effects.
+
+Requires: pandas, numpy, scipy
+
+This script will:
+1) Build a sparse design matrix from the merged panel: county and year FE
+   dummies plus exposure x 1[event time = e] columns around every farm bill,
+   where exposure is the county's share_corn_harvested_acres in the base year.
+2) Partial out both fixed effects from all outcomes at once (alternating
+   projections on sparse indicators, NaNs masked per column) instead of
+   materializing ~3,100 dummy columns.
+3) Estimate the event-time coefficients (one regression per bill) with
+   county-clustered standard errors -> tabs/.
+"""
+
+# -----------------------------
+# Configuration
+# -----------------------------
+DATA_FILE_PATH = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/interim/census_merged_1992_2022_deflated.tsv"
+OUTPUT_DIR     = "/Users/anyamarchenko/Documents/GitHub/corn/output"
+TABS_DIR       = "tabs"
+
+FARM_BILL_YEARS    = [1996, 2002, 2008, 2014, 2018]   # as in analyze_gov_payments.py (no post-2022 bill)
+OUTCOME_COLS       = ["gov_all_pf_real", "gov_all_amt_real", "gov_noncons_pf_calc_real", "ccc_loan_pf_real"]
+EXPOSURE_COL       = "share_corn_harvested_acres"
+EXPOSURE_BASE_YEAR = 1992           # exposure fixed at its pre-period value
+CENSUS_INTERVAL    = 5              # years per event-time step
+EVENT_WINDOW       = (-2, 3)        # event times kept; ends are binned
+REFERENCE_EVENT    = -1             # omitted event time
+DEMEAN_TOL         = 1e-8
+DEMEAN_MAX_ITER    = 500
+SAVE_DESIGN        = True
+COEF_FILE          = "event_study_coefs.csv"
+DESIGN_FILE        = "event_study_design.npz"
+
+# -----------------------------
+# Script
+# -----------------------------
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from census_panel import CensusPanel, as_panel
+
+
+def _indicator(codes: np.ndarray, n_cols: int) -> sparse.csr_matrix:
+    """(rows x n_cols) 0/1 matrix with a single 1 per row at `codes`."""
+    n = len(codes)
+    return sparse.csr_matrix((np.ones(n), (np.arange(n), codes)), shape=(n, n_cols))
+
+
+class EventStudyDesign:
+    """
+    County-year design for exposure x event-time regressions.
+
+        design = EventStudyDesign(panel)
+        design.X            # sparse [event columns | county FE | year FE (first year dropped)]
+        design.event        # sparse event columns only
+        design.demean(Y)    # two-way within transformation of (rows x k) outcomes
+    """
+
+    def __init__(self, panel,
+                 outcome_cols: list = OUTCOME_COLS,
+                 exposure_col: str = EXPOSURE_COL,
+                 base_year: int = EXPOSURE_BASE_YEAR,
+                 bill_years: list = FARM_BILL_YEARS,
+                 window: tuple = EVENT_WINDOW,
+                 reference: int = REFERENCE_EVENT,
+                 interval: int = CENSUS_INTERVAL):
+        g = as_panel(panel).counties()
+        g = g[g['fips'].notna() & g['year'].notna()]
+
+        # exposure: the county's base-year value, carried to all of its years
+        base = g[g['year'] == base_year]
+        exposure = pd.to_numeric(base[exposure_col], errors='coerce').groupby(base['fips']).first()
+        g = g.assign(exposure=g['fips'].map(exposure).astype('float64'))
+        g = g[g['exposure'].notna()].reset_index(drop=True)
+
+        self.fips = g['fips'].to_numpy('int64')
+        self.year = g['year'].to_numpy('int64')
+        self.county_codes, self.counties = pd.factorize(self.fips, sort=True)
+        self.year_codes, self.years = pd.factorize(self.year, sort=True)
+        self.outcome_cols = [c for c in outcome_cols if c in g.columns]
+        self.Y = g[self.outcome_cols].apply(pd.to_numeric, errors='coerce').to_numpy('float64')
+
+        # exposure x 1[event time == e] for each bill, window ends binned
+        x = g['exposure'].to_numpy()
+        lo, hi = window
+        cols, rows, data, self.event_terms = [], [], [], []
+        for bill in bill_years:
+            e = np.clip(np.floor((self.year - bill) / interval).astype(int), lo, hi)
+            for k in range(lo, hi + 1):
+                if k == reference:
+                    continue
+                hit = np.flatnonzero(e == k)
+                rows.append(hit)
+                cols.append(np.full(len(hit), len(self.event_terms)))
+                data.append(x[hit])
+                self.event_terms.append({'term': f"fb{bill}_e{k:+d}", 'bill': bill, 'event_time': k})
+        n = len(g)
+        self.event = sparse.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                                       shape=(n, len(self.event_terms)))
+
+        self._D_county = _indicator(self.county_codes, len(self.counties))
+        self._D_year = _indicator(self.year_codes, len(self.years))
+
+    @property
+    def X(self) -> sparse.csr_matrix:
+        """Full sparse design: event columns, county dummies, year dummies (first year dropped)."""
+        return sparse.hstack([self.event, self._D_county, self._D_year[:, 1:]], format='csr')
+
+    @property
+    def columns(self) -> list:
+        return ([t['term'] for t in self.event_terms]
+                + [f"county_{f}" for f in self.counties]
+                + [f"year_{y}" for y in self.years[1:]])
+
+    def demean(self, Y: np.ndarray, mask: np.ndarray = None,
+               tol: float = DEMEAN_TOL, max_iter: int = DEMEAN_MAX_ITER) -> np.ndarray:
+        """
+        Sweep county and year means out of every column of Y (rows x k) until
+        the largest update is below tol (alternating projections; exact in one
+        pass for balanced panels). NaN cells, or cells where mask is False, are
+        excluded from the means and stay NaN.
+        """
+        Y = np.array(Y, dtype='float64')
+        if Y.ndim == 1:
+            Y = Y[:, None]
+        W = np.isfinite(Y) if mask is None else (np.asarray(mask, bool) & np.isfinite(Y))
+        Z = np.where(W, Y, 0.0)
+        Wf = W.astype('float64')
+        counts = [D.T @ Wf for D in (self._D_county, self._D_year)]
+        for _ in range(max_iter):
+            step = 0.0
+            for D, cnt in zip((self._D_county, self._D_year), counts):
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    means = np.where(cnt > 0, (D.T @ Z) / cnt, 0.0)
+                update = (D @ means) * Wf
+                Z -= update
+                step = max(step, np.abs(update).max(initial=0.0))
+            if step < tol:
+                break
+        return np.where(W, Z, np.nan)
+
+    def estimate(self, pooled: bool = False) -> pd.DataFrame:
+        """
+        Event-time coefficients per outcome (Frisch-Waugh-Lovell on the demeaned
+        event columns) with county-clustered standard errors. One regression per
+        farm bill by default: with censuses every five years, the bills' event
+        columns are collinear with each other once year FE are in; pooled=True
+        puts all of them in one regression anyway.
+        """
+        bills = [None] if pooled else list(dict.fromkeys(t['bill'] for t in self.event_terms))
+        out = []
+        for bill in bills:
+            idx = [i for i, t in enumerate(self.event_terms) if bill is None or t['bill'] == bill]
+            out += self._fit(self.event[:, idx].toarray(), [self.event_terms[i] for i in idx])
+        cols = ['outcome', 'term', 'bill', 'event_time', 'coef', 'se', 'n', 'clusters']
+        return pd.concat(out, ignore_index=True)[cols] if out else pd.DataFrame(columns=cols)
+
+    def _fit(self, E: np.ndarray, event_terms: list) -> list:
+        out = []
+        for j, outcome in enumerate(self.outcome_cols):
+            obs = np.isfinite(self.Y[:, j])
+            M = np.repeat(obs[:, None], 1 + E.shape[1], axis=1)
+            Z = self.demean(np.column_stack([self.Y[:, j], E]), mask=M)
+            y, Xe = Z[obs, 0], Z[obs, 1:]
+            keep = np.abs(Xe).max(axis=0, initial=0.0) > 1e-9   # event times with no support
+            Xe = Xe[:, keep]
+            if len(y) <= Xe.shape[1]:
+                continue
+            beta, *_ = np.linalg.lstsq(Xe, y, rcond=None)
+            resid = y - Xe @ beta
+            bread = np.linalg.pinv(Xe.T @ Xe)
+            scores = Xe * resid[:, None]
+            cl = self.county_codes[obs]
+            S = np.zeros((len(self.counties), Xe.shape[1]))
+            np.add.at(S, cl, scores)
+            # county FE are nested in the clusters, so they don't count toward k
+            n_cl, n, k = len(np.unique(cl)), len(y), Xe.shape[1] + len(self.years) - 1
+            adj = n_cl / max(n_cl - 1, 1) * (n - 1) / max(n - k, 1)
+            se = np.sqrt(np.diag(bread @ (S.T @ S) @ bread) * adj)
+            terms = [t for t, k_ in zip(event_terms, keep) if k_]
+            out.append(pd.DataFrame(terms).assign(outcome=outcome, coef=beta, se=se, n=n, clusters=n_cl))
+        return out
+
+
+def main():
+    tabs_dir = Path(OUTPUT_DIR) / TABS_DIR
+    tabs_dir.mkdir(parents=True, exist_ok=True)
+
+    panel = CensusPanel.from_file(DATA_FILE_PATH)
+    design = EventStudyDesign(panel)
+    print(f"Design: {design.X.shape[0]} county-years x {design.X.shape[1]} columns "
+          f"({design.X.nnz} nonzeros; {len(design.event_terms)} event terms)")
+
+    if SAVE_DESIGN:
+        out_design = tabs_dir / DESIGN_FILE
+        sparse.save_npz(out_design, design.X)
+        out_design.with_suffix('.json').write_text(json.dumps({
+            'columns': design.columns,
+            'fips': design.fips.tolist(),
+            'year': design.year.tolist(),
+        }))
+        print(f"Saved: {out_design}")
+
+    coefs = design.estimate()
+    out = tabs_dir / COEF_FILE
+    coefs.to_csv(out, index=False)
+    print(f"Saved: {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact dashboard export of yearly county values.
+
+Requires: everything plot.py needs, plus topojson.
+pip install topojson
+
+This script will:
+1) Write the CONUS county geometry once as quantized TopoJSON, reusing the
+   projected + simplified boundary cache from plot.py (Albers, EPSG:5070; draw
+   it in the browser with d3.geoIdentity().reflectY(true)).
+2) Write one small JSON file per variable and year: {"fips5": value, ...}.
+3) Keep a manifest of value hashes so reruns only rewrite files whose values
+   changed, and the topology only when the boundaries or tolerance change.
+"""
+
+# -----------------------------
+# Configuration
+# -----------------------------
+DASHBOARD_DIR       = "/Users/anyamarchenko/Documents/GitHub/corn/output/dashboard"
+DASHBOARD_VARS      = ["gov_all_pf_real", "gov_all_amt_real", "gov_noncons_pf_calc_real",
+                       "farms_n", "corn_for_grain_acres", "share_corn_harvested_acres"]
+DASHBOARD_TOLERANCE = 1000                 # meters; one of plot.SIMPLIFY_TOLERANCES ideally
+QUANTIZATION        = 1e5                  # TopoJSON quantization grid
+SIG_DIGITS          = 6                    # significant digits kept in value files
+MANIFEST_FILE       = "manifest.json"
+
+# -----------------------------
+# Script
+# -----------------------------
+import os
+import json
+import hashlib
+from pathlib import Path
+import numpy as np
+import topojson
+
+from plot import (
+    DATA_FILE_PATH, COUNTY_SAVE_DIR, COUNTY_ZIP_URL, COUNTY_SHP_STEM, CONUS_ONLY, PROJ_CRS,
+    ensure_dir, download_counties_if_needed, boundary_cache_key, load_counties_cached,
+    load_panel_values, align_columns_to_geometry,
+)
+
+
+def _write_json_atomic(obj, path: Path):
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def export_topology(gdf, out_path: Path, quantization: float = QUANTIZATION) -> Path:
+    """
+    Quantized TopoJSON of the counties (object name 'counties', id = fips5).
+    The input is already coverage-simplified, so no further simplification here.
+    """
+    # features take their id from the index (__geo_interface__), so index on fips5
+    g = gdf[['fips5', 'NAME', 'STATEFP', 'geometry']].rename(columns={'NAME': 'name'})
+    g = g.set_index(g['fips5'].rename(None))
+    topo = topojson.Topology(g, object_name='counties', prequantize=quantization,
+                             toposimplify=False, topology=True)
+    ensure_dir(out_path.parent)
+    tmp_path = out_path.with_suffix(out_path.suffix + '.tmp')
+    topo.to_json(tmp_path)
+    os.replace(tmp_path, out_path)
+    print(f"Saved: {out_path}")
+    return out_path
+
+
+def value_payload(fips5: np.ndarray, values: np.ndarray, sig: int = SIG_DIGITS) -> dict:
+    """{fips5: value} for finite values only, rounded to `sig` significant digits."""
+    ok = np.isfinite(values)
+    return {f: float(f"{v:.{sig}g}") for f, v in zip(fips5[ok], values[ok])}
+
+
+def export_values(fips5: np.ndarray,
+                  cube: np.ndarray,
+                  years: list,
+                  value_cols: list,
+                  out_dir: Path,
+                  manifest: dict) -> int:
+    """
+    Write values/<var>/<year>.json, skipping files whose content hash matches
+    the manifest. Returns the number of files written.
+    """
+    written = 0
+    hashes = manifest.setdefault('values', {})
+    for k, var in enumerate(value_cols):
+        for t, yr in enumerate(years):
+            payload = value_payload(fips5, cube[:, t, k])
+            digest = hashlib.sha1(json.dumps(payload, separators=(',', ':')).encode()).hexdigest()
+            rel = f"values/{var}/{yr}.json"
+            if hashes.get(rel) == digest and (out_dir / rel).exists():
+                continue
+            ensure_dir((out_dir / rel).parent)
+            _write_json_atomic(payload, out_dir / rel)
+            hashes[rel] = digest
+            written += 1
+    return written
+
+
+def main():
+    out_dir = Path(DASHBOARD_DIR)
+    ensure_dir(out_dir)
+    manifest_path = out_dir / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    shp_path = download_counties_if_needed(Path(COUNTY_SAVE_DIR), COUNTY_ZIP_URL, COUNTY_SHP_STEM)
+    cache_key = boundary_cache_key(shp_path, PROJ_CRS, CONUS_ONLY)
+    gdf = load_counties_cached(shp_path, CONUS_ONLY, DASHBOARD_TOLERANCE, key=cache_key)
+
+    # 1) Geometry: only when boundaries, tolerance or quantization change
+    topo_name = f"counties_{cache_key}_tol{int(DASHBOARD_TOLERANCE)}_q{int(QUANTIZATION)}.topo.json"
+    if manifest.get('topology') != topo_name or not (out_dir / topo_name).exists():
+        export_topology(gdf, out_dir / topo_name)
+        manifest['topology'] = topo_name
+
+    # 2) Values: one file per variable-year, rewritten only when changed
+    df_values, col_map = load_panel_values(Path(DATA_FILE_PATH), DASHBOARD_VARS)
+    value_cols = [col_map[v] for v in DASHBOARD_VARS if col_map.get(v)]
+    years, cube = align_columns_to_geometry(gdf, df_values, value_cols)
+    written = export_values(gdf['fips5'].to_numpy(), cube, years, value_cols, out_dir, manifest)
+
+    manifest['variables'] = value_cols
+    manifest['years'] = [int(y) for y in years]
+    manifest['crs'] = PROJ_CRS
+    _write_json_atomic(manifest, manifest_path)
+    print(f"Wrote {written} value files; manifest: {manifest_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Dense (variable x year x county) float32 store of the merged census panel.
+
+collect_census_data.py writes it next to the merged TSVs:
+    panel_cube/cube.npy      float32, shape (n_vars, n_years, n_counties)
+    panel_cube/fips.npy      int32 county FIPS (cube axis 2)
+    panel_cube/years.npy     int32 census years (cube axis 1)
+    panel_cube/index.json    {"variables": [...], "shape": [...], "dtype": "float32"}
+
+Readers memory-map the cube, so every process on the box shares the same pages
+through the OS page cache and slices are zero-copy NumPy views:
+
+    cube = PanelCube("/.../interim/panel_cube")
+    cube.get("gov_all_pf_real")            # (year x county) view
+    cube.get("farms_n", 2017)              # (county,) view
+    cube.county("farms_n", 19153)          # one county across years
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+CUBE_FILE, FIPS_FILE, YEARS_FILE, INDEX_FILE = "cube.npy", "fips.npy", "years.npy", "index.json"
+
+
+def write_panel_cube(df: pd.DataFrame, out_dir, variables: list = None) -> Path:
+    """
+    Scatter county rows (level==1) of `df` into a float32 cube written straight
+    to a memory-mapped .npy. Non-numeric variables are skipped. All four files
+    are written to a temp directory that then replaces out_dir, so readers never
+    pair a new cube with an old index (or see a partial one).
+    """
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(f".{out_dir.name}.tmp")
+    old_dir = out_dir.with_name(f".{out_dir.name}.old")
+    for d in (tmp_dir, old_dir):
+        if d.exists():
+            shutil.rmtree(d)
+    tmp_dir.mkdir(parents=True)
+
+    lvl = pd.to_numeric(df['level'], errors='coerce')
+    counties = df[lvl == 1]
+    fips = pd.to_numeric(counties['fips'], errors='coerce')
+    year = pd.to_numeric(counties['year'], errors='coerce')
+    ok = (fips.notna() & year.notna()).to_numpy()
+
+    if variables is None:
+        skip = {'year', 'name', 'level', 'fips', 'statefip', 'counfip'}
+        variables = [c for c in df.columns if c not in skip]
+    vals = counties[variables].apply(pd.to_numeric, errors='coerce')
+    variables = [v for v in variables if vals[v].notna().any()]
+
+    fips_index = np.unique(fips[ok].astype('int64').to_numpy())
+    year_index = np.unique(year[ok].astype('int64').to_numpy())
+    c = np.searchsorted(fips_index, fips[ok].astype('int64').to_numpy())
+    t = np.searchsorted(year_index, year[ok].astype('int64').to_numpy())
+
+    shape = (len(variables), len(year_index), len(fips_index))
+    try:
+        cube = np.lib.format.open_memmap(tmp_dir / CUBE_FILE, mode='w+', dtype=np.float32, shape=shape)
+        cube[:] = np.nan
+        data = vals[variables].to_numpy(np.float32)[ok]          # (rows x vars)
+        cube[:, t, c] = data.T
+        cube.flush()
+        del cube
+
+        np.save(tmp_dir / FIPS_FILE, fips_index.astype(np.int32))
+        np.save(tmp_dir / YEARS_FILE, year_index.astype(np.int32))
+        (tmp_dir / INDEX_FILE).write_text(
+            json.dumps({'variables': variables, 'shape': list(shape), 'dtype': 'float32'}, indent=1))
+
+        # swap the whole directory: old -> .old, new -> out_dir, drop .old
+        # (processes still mapping the old cube keep their pages until they close it)
+        if out_dir.exists():
+            os.replace(out_dir, old_dir)
+        os.replace(tmp_dir, out_dir)
+    finally:
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    return out_dir
+
+
+class PanelCube:
+    """Read-only, memory-mapped view of a cube written by write_panel_cube."""
+
+    def __init__(self, cube_dir):
+        cube_dir = Path(cube_dir)
+        meta = json.loads((cube_dir / INDEX_FILE).read_text())
+        self.data = np.load(cube_dir / CUBE_FILE, mmap_mode='r')
+        self.fips = np.load(cube_dir / FIPS_FILE)
+        self.years = np.load(cube_dir / YEARS_FILE)
+        if list(self.data.shape) != meta['shape'] or self.data.shape[1:] != (len(self.years), len(self.fips)):
+            raise RuntimeError(f"{cube_dir} was replaced while loading; open it again")
+        self.variables = meta['variables']
+        self._var = {v: i for i, v in enumerate(self.variables)}
+        self._year = {int(y): i for i, y in enumerate(self.years)}
+
+    def get(self, variable: str, year: int = None) -> np.ndarray:
+        """(year x county) view for a variable, or (county,) view for one year."""
+        block = self.data[self._var[variable]]
+        return block if year is None else block[self._year[int(year)]]
+
+    def county(self, variable: str, fips: int) -> np.ndarray:
+        """One county's values across years (view)."""
+        pos = np.searchsorted(self.fips, fips)
+        if pos >= len(self.fips) or self.fips[pos] != fips:
+            raise KeyError(f"FIPS {fips} not in cube")
+        return self.data[self._var[variable], :, pos]
+
+    def county_positions(self, fips) -> np.ndarray:
+        """Cube column of each FIPS (-1 if absent)."""
+        fips = np.asarray(fips)
+        pos = np.clip(np.searchsorted(self.fips, fips), 0, len(self.fips) - 1)
+        return np.where(self.fips[pos] == fips, pos, -1)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Content hashes of the merged panel per (column, year), and a diff between runs.
+
+collect_census_data.py writes a hash manifest next to the deflated TSV and
+keeps the previous one as *.prev.json (plus, with KEEP_PREVIOUS_SNAPSHOT, a
+snapshot of the data file it describes as *.prev.tsv.zst), so after every
+build:
+
+    python panel_diff.py OLD.hashes.json NEW.hashes.json            # changed blocks
+    python panel_diff.py OLD.hashes.json NEW.hashes.json --cells    # + changed cells
+
+Block hashes are computed on the values in (level, fips) order within each
+year (numbers as float64, text as UTF-8), so they only change when content
+does; they can also key downstream caches. The cell drill-down reads just the
+mismatched columns and years from the two data files recorded in the
+manifests; both must be distinct files, so --cells needs the snapshot (the
+snapshot is a second copy of the largest output, hence opt-in).
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from census_panel import read_panel_tsv
+
+KEY_COLS = ['year', 'level', 'fips']
+RTOL = 1e-6     # relative tolerance for numeric cells in the drill-down
+
+
+def _digest(s: pd.Series) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        h.update(pd.to_numeric(s, errors='coerce').to_numpy('float64', na_value=np.nan).tobytes())
+    else:
+        h.update('\x1f'.join('\x00' if pd.isna(v) else str(v) for v in s).encode('utf-8'))
+    return h.hexdigest()
+
+
+def panel_hashes(df: pd.DataFrame, source=None) -> dict:
+    """{'columns': {col: {year: hash}}, 'keys': {year: hash}, 'rows': {year: n}, 'source': path}."""
+    year = pd.to_numeric(df['year'], errors='coerce')
+    out = {'source': str(source) if source else None,
+           'columns': {c: {} for c in df.columns if c != 'year'},
+           'keys': {}, 'rows': {}}
+    for y, block in df.groupby(year, sort=True):
+        # int64: compact_panel keys are Int8/Int32 and would overflow below
+        lvl = pd.to_numeric(block['level'], errors='coerce').fillna(-1).to_numpy('int64')
+        fips = pd.to_numeric(block['fips'], errors='coerce').fillna(-1).to_numpy('int64')
+        order = np.lexsort((fips, lvl))
+        block = block.iloc[order]
+        key = str(int(y))
+        out['rows'][key] = len(block)
+        out['keys'][key] = _digest(pd.Series(lvl[order] * 100_000 + fips[order]))
+        for c in out['columns']:
+            out['columns'][c][key] = _digest(block[c])
+    return out
+
+
+def _prev_name(path: Path) -> Path:
+    """x.hashes.json -> x.hashes.prev.json, x.tsv.zst -> x.prev.tsv.zst."""
+    if path.name.endswith('.json'):
+        return path.with_name(path.name[:-len('.json')] + '.prev.json')
+    stem, _, rest = path.name.partition('.')
+    return path.with_name(f"{stem}.prev.{rest}" if rest else f"{stem}.prev")
+
+
+def rotate_manifest(path, snapshot: bool = False) -> Path:
+    """
+    Move the manifest at `path` to *.prev.json. With `snapshot`, also keep the
+    data file it describes next to it (hard link, or a copy where links are
+    unsupported) and point the old manifest's source at it, so --cells can
+    compare two different files; call before the data file is overwritten.
+    Returns the snapshot path, or None if none was kept.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    manifest = json.loads(path.read_text())
+    src = Path(manifest['source']) if manifest.get('source') else None
+    snap = None
+    if snapshot and src is not None and src.exists():
+        snap = _prev_name(src)
+        if snap.exists():
+            snap.unlink()
+        try:
+            os.link(src, snap)
+        except OSError:
+            shutil.copy2(src, snap)
+        manifest['source'] = str(snap)
+    prev = _prev_name(path)
+    tmp = prev.with_name(f".{prev.name}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=1))
+    tmp.replace(prev)
+    path.unlink()
+    return snap
+
+
+def write_hash_manifest(df: pd.DataFrame, path, source=None, keep_previous: bool = True) -> dict:
+    """Write the hash manifest (previous one kept as *.prev.json); returns the new manifest."""
+    path = Path(path)
+    manifest = panel_hashes(df, source)
+    if keep_previous and path.exists():
+        path.replace(_prev_name(path))
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=1))
+    tmp.replace(path)
+    return manifest
+
+
+def compare_manifests(old: dict, new: dict) -> pd.DataFrame:
+    """One row per (column, year) block that differs: status changed / added / removed."""
+    rows = []
+    cols = list(dict.fromkeys(list(old['columns']) + list(new['columns'])))
+    for c in cols:
+        a, b = old['columns'].get(c, {}), new['columns'].get(c, {})
+        for y in sorted(set(a) | set(b)):
+            if y not in a:
+                rows.append({'column': c, 'year': int(y), 'status': 'added'})
+            elif y not in b:
+                rows.append({'column': c, 'year': int(y), 'status': 'removed'})
+            elif a[y] != b[y]:
+                rows.append({'column': c, 'year': int(y), 'status': 'changed'})
+    for y in sorted(set(old['keys']) | set(new['keys'])):
+        if old['keys'].get(y) != new['keys'].get(y):
+            rows.append({'column': '(rows)', 'year': int(y), 'status': 'changed',
+                         'old_rows': old['rows'].get(y), 'new_rows': new['rows'].get(y)})
+    return pd.DataFrame(rows, columns=['column', 'year', 'status', 'old_rows', 'new_rows'])
+
+
+def diff_cells(old_df: pd.DataFrame, new_df: pd.DataFrame, blocks: pd.DataFrame, rtol: float = RTOL) -> pd.DataFrame:
+    """Changed cells for the 'changed' blocks only, keyed by (year, level, fips)."""
+    changed = blocks[(blocks['status'] == 'changed') & (blocks['column'] != '(rows)')]
+    out = []
+    for col, grp in changed.groupby('column'):
+        years = set(grp['year'])
+        a = old_df.loc[pd.to_numeric(old_df['year'], errors='coerce').isin(years), KEY_COLS + [col]].copy()
+        b = new_df.loc[pd.to_numeric(new_df['year'], errors='coerce').isin(years), KEY_COLS + [col]].copy()
+        for d in (a, b):
+            d[KEY_COLS] = d[KEY_COLS].apply(pd.to_numeric, errors='coerce')
+        m = a.merge(b, on=KEY_COLS, how='outer', suffixes=('_old', '_new'), indicator=True)
+        old, new = m[f"{col}_old"], m[f"{col}_new"]
+        on, nn = pd.to_numeric(old, errors='coerce'), pd.to_numeric(new, errors='coerce')
+        if on.notna().any() or nn.notna().any():
+            same = np.isclose(on.to_numpy('float64'), nn.to_numpy('float64'), rtol=rtol, atol=0, equal_nan=True)
+        else:
+            same = (old.astype(str) == new.astype(str)).to_numpy() | (old.isna() & new.isna()).to_numpy()
+        diff = m[~same | (m['_merge'] != 'both')]
+        out.append(pd.DataFrame({'column': col, **{k: diff[k] for k in KEY_COLS},
+                                 'old': diff[f"{col}_old"], 'new': diff[f"{col}_new"]}))
+    cols = ['column'] + KEY_COLS + ['old', 'new']
+    return pd.concat(out, ignore_index=True)[cols] if out else pd.DataFrame(columns=cols)
+
+
+def _same_source(old: dict, new: dict) -> bool:
+    a, b = old.get('source'), new.get('source')
+    return bool(a and b) and Path(a).resolve() == Path(b).resolve()
+
+
+def _load_blocks(manifest: dict, blocks: pd.DataFrame) -> pd.DataFrame:
+    src = manifest.get('source')
+    if not src or not (Path(src).exists() or any(Path(src + s).exists() for s in ('.zst', '.gz'))):
+        raise FileNotFoundError(f"data file for cell diff not found: {src}")
+    cols = set(KEY_COLS) | set(blocks['column']) - {'(rows)'}
+    return read_panel_tsv(src, usecols=lambda c: c in cols)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two panel hash manifests.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--cells", action="store_true", help="drill down to changed cells")
+    parser.add_argument("--out", help="write the block (or cell) report to this TSV")
+    args = parser.parse_args()
+
+    old = json.loads(Path(args.old).read_text())
+    new = json.loads(Path(args.new).read_text())
+    blocks = compare_manifests(old, new)
+    if blocks.empty:
+        print("No differences.")
+        return
+    summary = blocks.groupby(['column', 'status'])['year'].apply(lambda y: ','.join(map(str, sorted(y))))
+    print(f"{len(blocks)} changed (column, year) blocks:")
+    print(summary.to_string())
+
+    report = blocks
+    if args.cells:
+        if _same_source(old, new):
+            raise ValueError(f"both manifests point at {new['source']}, which the newer build overwrote; "
+                             "cell diffs need the previous run's snapshot (*.prev.tsv.zst; "
+                             "set KEEP_PREVIOUS_SNAPSHOT in collect_census_data.py)")
+        report = diff_cells(_load_blocks(old, blocks), _load_blocks(new, blocks), blocks)
+        print(f"\n{len(report)} changed cells:")
+        print(report.head(50).to_string(index=False))
+    if args.out:
+        report.to_csv(args.out, sep='\t', index=False)
+        print(f"Saved: {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,16 @@
 """
 Choropleths of county-level geographic variation in government payments (real $) over time.
 
-Requires: pandas, geopandas, matplotlib, requests, pyproj, shapely, mapclassify
-pip install pandas geopandas matplotlib requests mapclassify
+Requires: pandas, geopandas>=1.0, matplotlib, requests, pyproj, shapely>=2.1, mapclassify, pyarrow
+pip install pandas geopandas matplotlib requests mapclassify pyarrow
 
 This script will:
 1) Download county boundaries to the configured folder (if missing).
 2) Merge your deflated census data by county FIPS.
-3) Produce a per-year choropleth shaded by the configured value column.
+3) Produce a per-year choropleth for every job in MAP_JOBS (variable, corn cutoff,
+   color-scale normalization), loading data and geometry only once.
 4) Optionally create a small-multiples panel for all years on one figure.
+5) Optionally write a time-lapse animation (GIF/MP4) of the same variable.
 """
 
 # -----------------------------
@@ -24,6 +26,15 @@ FIGS_DIR       = "figs"
 TABS_DIR       = "tabs"
 
 COUNTY_SAVE_DIR = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/counties"
+BOUNDARY_CACHE_DIR = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/counties/cache"
+
+# USDA ERS Farm Resource Regions: county crosswalk with columns fips, region (1-9)
+FARM_REGION_FILE  = "/Users/anyamarchenko/CEGA Dropbox/Anya Marchenko/corn/raw/counties/ers_farm_resource_regions.csv"
+FARM_REGION_NAMES = {
+    1: "Heartland", 2: "Northern Crescent", 3: "Northern Great Plains",
+    4: "Prairie Gateway", 5: "Eastern Uplands", 6: "Southern Seaboard",
+    7: "Fruitful Rim", 8: "Basin and Range", 9: "Mississippi Portal",
+}
 
 # Column names in your merged dataframe
 YEAR_COL  = "year"
@@ -32,6 +43,9 @@ FIPS_COL  = "fips"
 VALUE_COL = "gov_pay_total_real"  
 CORN_FLAG = True #True means we filter for counties that have >0 acres of corn 
 CORN_ACRE_CUTOFF = 300
+CORN_COL  = "corn_for_grain_acres"
+MAP_TITLE  = "Government Payments per Farm by County (2017 $)"
+CBAR_LABEL = "Dollars per Farm (2017 $)"
 
 # Map options
 CONUS_ONLY        = True                   
@@ -44,6 +58,54 @@ FIGSIZE_PANEL     = (16, 10)
 NORMALIZE_GLOBAL  = True                   # True: same color scale for all years
 CLIP_QUANTILES    = (0.02, 0.98)           # clip extremes when computing global vmin/vmax
 SAVE_PANEL_FIG    = True
+N_WORKERS         = 4                      # processes rendering per-year maps (1 = serial)
+
+# Projected + simplified boundary cache (GeoParquet), tolerances in CRS units (meters)
+PROJ_CRS            = "EPSG:5070"          # Albers Equal Area
+SIMPLIFY_TOLERANCES = (0, 1000, 5000)      # 0 = full resolution
+MAP_TOLERANCE       = 0                    # single-year maps
+PANEL_TOLERANCE     = 1000                 # small-multiples panel
+
+# Time-lapse animation (.gif via Pillow, .mp4 via a local ffmpeg)
+SAVE_ANIMATION    = True
+ANIMATION_FILE    = "county_choropleth_timelapse.gif"
+ANIMATION_FPS     = 4
+ANIMATION_TWEEN   = 3                      # interpolated frames between census years
+ANIMATION_DPI     = 120
+
+# Batch mode: all jobs share one data load, one geometry load and one worker pool.
+#   value_col   : column in the merged panel
+#   corn_cutoff : keep counties with corn_for_grain_acres > cutoff (None = all counties)
+#   normalize   : 'global' (one color scale across years) or 'year' (per-year scale)
+#   geo         : 'county' (default), 'state' or 'region' (ERS farm resource regions)
+#   weight_col / agg : for state/region maps, aggregate counties by 'mean' (weighted
+#                 by weight_col if given, e.g. farms_n) or 'sum'
+#   scheme / k  : 'linear' (default), 'quantiles', 'equal_interval', 'fisher_jenks'
+#                 or 'headtail'; classed bins are computed across all years and cached
+#   title / cbar_label (optional): default to MAP_TITLE / CBAR_LABEL
+#   Outputs go to figs/<value_col>[_corn<cutoff>]_<normalize>/
+MAP_JOBS = [
+    {"value_col": VALUE_COL,
+     "corn_cutoff": CORN_ACRE_CUTOFF if CORN_FLAG else None,
+     "normalize": "global" if NORMALIZE_GLOBAL else "year"},
+    {"value_col": "gov_all_pf_real", "corn_cutoff": None, "normalize": "global"},
+    {"value_col": "gov_noncons_pf_calc_real", "corn_cutoff": CORN_ACRE_CUTOFF, "normalize": "global",
+     "scheme": "fisher_jenks", "k": 6},
+    {"value_col": "gov_all_pf_real", "corn_cutoff": None, "normalize": "global",
+     "geo": "state", "weight_col": "farms_n", "agg": "mean",
+     "title": "Government Payments per Farm by State (2017 $)"},
+    {"value_col": "gov_all_amt_real", "corn_cutoff": None, "normalize": "global",
+     "geo": "region", "agg": "sum",
+     "title": "Government Payments by Farm Resource Region (2017 $)",
+     "cbar_label": "Total Dollars (2017 $)"},
+    {"value_col": "share_corn_harvested_acres", "corn_cutoff": 0, "normalize": "year",
+     "title": "Corn Share of Harvested Cropland by County",
+     "cbar_label": "Share of harvested acres"},
+]
+
+# Classification bins cache (JSON under OUTPUT_DIR/TABS_DIR)
+CLASS_BINS_FILE     = "choropleth_class_bins.json"
+FISHER_JENKS_SAMPLE = 2000                 # Fisher-Jenks is O(n^2): fit on a fixed sample
 
 # County boundary source (Cartographic 1:5m)
 # See: https://www2.census.gov/geo/tiger/GENZ2022/shp/
@@ -56,12 +118,23 @@ COUNTY_SHP_STEM   = "cb_2022_us_county_5m"      # shapefile stem inside the zip
 import os
 from pathlib import Path
 import io
+import json
+import hashlib
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 import requests
+import mapclassify
 import numpy as np
 import pandas as pd
 import geopandas as gpd
+import shapely
 import matplotlib.pyplot as plt
+from matplotlib.collections import PatchCollection
+from matplotlib.colors import BoundaryNorm
+from matplotlib.patches import PathPatch
+from matplotlib.path import Path as MplPath
+
+from census_panel import CensusPanel, read_panel_tsv
 
 plt.style.use('seaborn-v0_8')
 
@@ -104,7 +177,7 @@ def load_counties(shp_path: Path, conus_only: bool = True) -> gpd.GeoDataFrame:
 
     # Project to Albers Equal Area for nicer rendering
     try:
-        gdf = gdf.to_crs("EPSG:5070")
+        gdf = gdf.to_crs(PROJ_CRS)
     except Exception:
         # if proj errors, keep in original
         pass
@@ -112,53 +185,195 @@ def load_counties(shp_path: Path, conus_only: bool = True) -> gpd.GeoDataFrame:
     gdf['fips5'] = gdf['GEOID'].astype(str).str.zfill(5)
     return gdf
 
-def load_value_data(data_path: Path,
-                    year_col: str,
-                    level_col: str,
-                    fips_col: str,
-                    value_col: str) -> pd.DataFrame:
+def _file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def simplify_counties(gdf: gpd.GeoDataFrame, tolerance: float) -> gpd.GeoDataFrame:
     """
-    Read TSV, filter to county rows (level==1), build fips5, keep year/value.
-    If the requested value_col is missing, try a couple of common fallbacks.
+    Topology-preserving simplification of the county coverage: each shared border
+    is simplified once for both neighbours, so no gaps or slivers appear.
+    Row order is kept, so value arrays aligned to one tolerance fit all of them.
     """
-    df = pd.read_csv(data_path, sep="\t", low_memory=False)
-    # Filter to counties
-    if level_col in df.columns:
-        df = df[df[level_col] == 1].copy()
-    # Build fips5
+    if not tolerance:
+        return gdf
+    if not hasattr(shapely, 'coverage_simplify'):
+        raise ImportError("Coverage simplification requires shapely>=2.1 (GEOS>=3.12).")
+    simplified = shapely.coverage_simplify(np.asarray(gdf.geometry.values), tolerance)
+    out = gdf.copy()
+    out['geometry'] = gpd.GeoSeries(simplified, index=gdf.index, crs=gdf.crs)
+    return out
+
+def boundary_cache_key(shp_path: Path, crs: str = PROJ_CRS, conus_only: bool = True) -> str:
+    """Cache key from the source shapefile bytes, target CRS and CONUS filter."""
+    sources = [shp_path] + [shp_path.with_suffix(ext) for ext in ('.dbf', '.shx')]
+    digest = "|".join(_file_sha256(p) for p in sources if p.exists())
+    return hashlib.sha256(f"{digest}|{crs}|{conus_only}".encode()).hexdigest()[:16]
+
+def build_boundary_cache(shp_path: Path,
+                         cache_dir: Path,
+                         conus_only: bool = True,
+                         tolerances=SIMPLIFY_TOLERANCES,
+                         key: str = None) -> dict:
+    """
+    Read + filter + project the shapefile once and write one GeoParquet file per
+    simplification tolerance. Returns {tolerance: path}.
+    """
+    ensure_dir(cache_dir)
+    key = key or boundary_cache_key(shp_path, PROJ_CRS, conus_only)
+    gdf = load_counties(shp_path, conus_only=conus_only)
+    paths = {}
+    for tol in tolerances:
+        out_path = cache_dir / f"counties_{key}_tol{int(tol)}.parquet"
+        tmp_path = out_path.with_suffix('.parquet.tmp')
+        simplify_counties(gdf, tol).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, out_path)
+        paths[tol] = out_path
+    print(f"Cached county boundaries ({len(paths)} tolerances) in: {cache_dir}")
+    return paths
+
+def load_counties_cached(shp_path: Path,
+                         conus_only: bool = True,
+                         tolerance: float = 0,
+                         cache_dir: Path = None,
+                         key: str = None) -> gpd.GeoDataFrame:
+    """
+    Projected, CONUS-filtered counties at the given tolerance from the boundary
+    cache; builds the cache on a miss (new shapefile, CRS or tolerance).
+    """
+    cache_dir = Path(cache_dir or BOUNDARY_CACHE_DIR)
+    key = key or boundary_cache_key(shp_path, PROJ_CRS, conus_only)
+    path = cache_dir / f"counties_{key}_tol{int(tolerance)}.parquet"
+    if not path.exists():
+        tolerances = sorted(set(SIMPLIFY_TOLERANCES) | {tolerance})
+        build_boundary_cache(shp_path, cache_dir, conus_only, tolerances, key=key)
+    return gpd.read_parquet(path)
+
+# -----------------------------
+# State / farm-resource-region dissolves
+# -----------------------------
+def county_group_codes(gdf_counties: gpd.GeoDataFrame,
+                       geo: str,
+                       region_file: Path = None) -> np.ndarray:
+    """
+    Integer group per county row: state FIPS for geo='state', ERS farm resource
+    region for geo='region'. Counties without a group get -1.
+    """
+    if geo == 'state':
+        return pd.to_numeric(gdf_counties['STATEFP'], errors='coerce').fillna(-1).astype(int).to_numpy()
+    if geo == 'region':
+        xwalk = pd.read_csv(region_file or FARM_REGION_FILE)[['fips', 'region']]
+        xwalk = xwalk.apply(pd.to_numeric, errors='coerce').dropna().astype(int)
+        region_of = xwalk.drop_duplicates('fips').set_index('fips')['region']
+        codes = region_of.reindex(gdf_counties['fips5'].astype(int).to_numpy())
+        return codes.fillna(-1).astype(int).to_numpy()
+    raise ValueError("geo must be 'state' or 'region'")
+
+def load_groups_cached(shp_path: Path,
+                       geo: str,
+                       conus_only: bool = True,
+                       tolerance: float = 0,
+                       cache_dir: Path = None,
+                       key: str = None,
+                       region_file: Path = None) -> gpd.GeoDataFrame:
+    """
+    State or farm-resource-region polygons dissolved from the cached counties at
+    the same tolerance, cached as GeoParquet next to the county files. Rows are
+    sorted by the integer 'group' code.
+    """
+    cache_dir = Path(cache_dir or BOUNDARY_CACHE_DIR)
+    key = key or boundary_cache_key(shp_path, PROJ_CRS, conus_only)
+    if geo == 'region':
+        region_file = Path(region_file or FARM_REGION_FILE)
+        key = hashlib.sha256(f"{key}|{_file_sha256(region_file)}".encode()).hexdigest()[:16]
+    path = cache_dir / f"{geo}_{key}_tol{int(tolerance)}.parquet"
+    if path.exists():
+        return gpd.read_parquet(path)
+
+    counties = load_counties_cached(shp_path, conus_only, tolerance, cache_dir)
+    counties = counties[['geometry']].assign(group=county_group_codes(counties, geo, region_file))
+    counties = counties[counties['group'] >= 0]
+    # counties form a coverage, so the fast coverage union is exact here
+    groups = counties.dissolve(by='group', method='coverage').reset_index()
+    if geo == 'region':
+        groups['name'] = groups['group'].map(FARM_REGION_NAMES)
+    ensure_dir(cache_dir)
+    tmp_path = path.with_suffix('.parquet.tmp')
+    groups.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    print(f"Cached {geo} boundaries: {path}")
+    return groups
+
+def aggregate_to_groups(values: np.ndarray,
+                        group_rows: np.ndarray,
+                        n_groups: int,
+                        weights: np.ndarray = None,
+                        agg: str = 'mean') -> np.ndarray:
+    """
+    (county x year) -> (group x year) in one bincount over all years.
+    `group_rows` gives each county's row in the dissolved frame (-1 = none);
+    'mean' is weighted by `weights` (county x year) when given, 'sum' ignores them.
+    NaN values (and NaN weights) are left out.
+    """
+    n_counties, n_years = values.shape
+    w = np.ones_like(values) if (weights is None or agg == 'sum') else weights
+    valid = np.isfinite(values) & np.isfinite(w) & (group_rows >= 0)[:, None]
+    flat = (group_rows[:, None] * n_years + np.arange(n_years)[None, :])[valid]
+
+    size = n_groups * n_years
+    total = np.bincount(flat, weights=(values * w)[valid], minlength=size)
+    if agg == 'sum':
+        count = np.bincount(flat, minlength=size)
+        out = np.where(count > 0, total, np.nan)
+    else:
+        wsum = np.bincount(flat, weights=w[valid], minlength=size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = np.where(wsum > 0, total / wsum, np.nan)
+    return out.reshape(n_groups, n_years)
+
+def load_panel_values(data_path: Path,
+                      value_cols: list,
+                      year_col: str = YEAR_COL,
+                      level_col: str = LEVEL_COL,
+                      fips_col: str = FIPS_COL,
+                      corn_col: str = CORN_COL):
+    """
+    Read the TSV (plain or .zst/.gz) once, keep county rows and clean every
+    requested value column (plus corn_col) in one vectorized pass.
+    Returns (df with year/fips5/value columns, {requested: actual column or None}).
+    """
+    df = read_panel_tsv(data_path)
     if fips_col not in df.columns:
         raise KeyError(f"'{fips_col}' not found in data.")
-    df['fips5'] = pd.to_numeric(df[fips_col], errors='coerce') \
-                    .astype('Int64') \
-                    .astype(str) \
-                    .str.replace('<NA>', '', regex=False) \
-                    .str.zfill(5)
-
-    if CORN_FLAG == True:
-        df['corn_for_grain_acres'] = pd.to_numeric(
-            df['corn_for_grain_acres'].astype(str).str.replace(r'[^\d\.\-]', '', regex=True),
-            errors='coerce'
-        )
-        df = df[df['corn_for_grain_acres'].notna() & (df['corn_for_grain_acres'] > CORN_ACRE_CUTOFF)].copy()
-
-    # Choose value column
-    candidates = [value_col, 'gov_pay_total_real', 'gov_payments_total_real']
-    chosen = None
-    for c in candidates:
-        if c in df.columns:
-            chosen = c
-            break
-    if chosen is None:
-        raise KeyError(f"None of the expected value columns found: {candidates}")
-
-    # Keep tidy set
-    sub = df[[year_col, 'fips5', chosen]].copy()
-    sub = sub.rename(columns={chosen: 'value'})
-    # Numeric
-    sub['value'] = pd.to_numeric(sub['value'], errors='coerce')
+    if level_col in df.columns:
+        df = CensusPanel(df, level_col, year_col, fips_col).counties()
+
+    # Resolve requested columns (VALUE_COL falls back to the legacy payment names)
+    col_map = {}
+    for c in value_cols:
+        candidates = [c, 'gov_pay_total_real', 'gov_payments_total_real'] if c == VALUE_COL else [c]
+        col_map[c] = next((k for k in candidates if k in df.columns), None)
+    cols = list(dict.fromkeys([v for v in col_map.values() if v] + [corn_col]))
+    cols = [c for c in cols if c in df.columns]
+
+    out = df[[year_col] + cols].copy()
+    out['fips5'] = pd.to_numeric(df[fips_col], errors='coerce') \
+                     .astype('Int64') \
+                     .astype(str) \
+                     .str.replace('<NA>', '', regex=False) \
+                     .str.zfill(5)
+    # corn acres can carry thousands separators/markers in the text; strip only
+    # that column (a blanket strip mangles text and scientific notation)
+    if corn_col in cols and out[corn_col].dtype == object:
+        out[corn_col] = out[corn_col].astype(str).str.replace(r'[^\d\.\-]', '', regex=True)
+    out[cols] = out[cols].apply(pd.to_numeric, errors='coerce')
+
     # Aggregate in case of duplicates (rare): mean per county-year
-    sub = sub.groupby([year_col, 'fips5'], as_index=False)['value'].mean()
-    return sub
+    out = out.groupby([year_col, 'fips5'], as_index=False)[cols].mean()
+    return out, col_map
 
 
 
@@ -177,56 +392,131 @@ def compute_global_scale(values: pd.Series, clip_q=(0.02, 0.98)):
     return float(lo), float(hi)
 
 
-
-def plot_year_map(gdf_base: gpd.GeoDataFrame,
-                  df_year: pd.DataFrame,
-                  year: int,
-                  vmin=None,
-                  vmax=None,
-                  out_dir: Path = None):
-    """
-    Plot one year's county choropleth, saving to PNG.
-    """
-    g = gdf_base.merge(df_year, on='fips5', how='left')
-    fig, ax = plt.subplots(1, 1, figsize=FIGSIZE_SINGLE)
-    g.plot(column='value',
-           ax=ax,
-           cmap=CMAP,
-           linewidth=LINE_WIDTH,
-           edgecolor=LINE_COLOR,
-           missing_kwds={"color": MISSING_COLOR, "label": "No data"},
-           vmin=vmin, vmax=vmax)
-    ax.set_axis_off()
-    if CORN_FLAG == True:
-        ttl = f"Government Payments per Farm by County (2017 $)\nYear: {year}, Corn Growing Counties Only"
+_CLASS_BINS_CACHE = {}
+
+def _class_edges(y: np.ndarray, scheme: str, k: int) -> np.ndarray:
+    """Bin edges [min, b1, ..., max] for one classification scheme."""
+    if scheme == 'quantiles':
+        bins = mapclassify.Quantiles(y, k=k).bins
+    elif scheme == 'equal_interval':
+        bins = mapclassify.EqualInterval(y, k=k).bins
+    elif scheme == 'fisher_jenks':
+        # fit on a reproducible sample (always keeping min and max), then cap at max
+        if len(y) > FISHER_JENKS_SAMPLE:
+            rng = np.random.default_rng(0)
+            sample = np.concatenate([rng.choice(y, FISHER_JENKS_SAMPLE, replace=False),
+                                     [y.min(), y.max()]])
+        else:
+            sample = y
+        # fit on the values themselves, not np.unique(): repeated values
+        # (zeros, rounded acres) are part of the distribution being classed
+        bins = mapclassify.FisherJenks(sample, k=k).bins
+    elif scheme == 'headtail':
+        bins = mapclassify.HeadTailBreaks(y).bins
     else:
-        ttl = f"Government Payments per Farm by County (2017 $)\nYear: {year}"
-    ax.set_title(ttl, fontsize=14, fontweight='bold')
-    # Colorbar
-    sm = plt.cm.ScalarMappable(cmap=CMAP,
-                               norm=plt.Normalize(vmin=vmin, vmax=vmax) if (vmin is not None and vmax is not None) else None)
-    sm._A = []
-    cbar = fig.colorbar(sm, ax=ax, fraction=0.030, pad=0.02)
-    cbar.ax.set_ylabel("Dollars per Farm (2017 $)", rotation=90)
-    plt.tight_layout()
+        raise ValueError(f"Unknown classification scheme: {scheme}")
+    bins = np.asarray(bins, dtype=float)
+    bins[-1] = max(bins[-1], y.max())
+    edges = np.unique(np.concatenate([[y.min()], bins]))
+    if len(edges) < 2:
+        # all values equal: BoundaryNorm needs at least two increasing edges
+        edges = np.array([edges[0] - 0.5, edges[0] + 0.5])
+    return edges
+
+def get_class_bins(values: np.ndarray,
+                   scheme: str,
+                   k: int = 5,
+                   name: str = "",
+                   cache_path: Path = None) -> np.ndarray:
+    """
+    Classification edges computed once per variable across all years.
+    Cached in memory and in a JSON file keyed by name, scheme, k and a hash of
+    the values, so reruns on unchanged data skip the classification entirely.
+    """
+    y = np.asarray(values, dtype=float).ravel()
+    y = y[np.isfinite(y)]
+    if y.size == 0:
+        return None
+    digest = hashlib.sha1(np.ascontiguousarray(y).tobytes()).hexdigest()[:12]
+    key = f"{name}|{scheme}|{k}|{digest}|v2"     # v2: Fisher-Jenks fit on the sampled values, not np.unique(sample)
+    if key in _CLASS_BINS_CACHE:
+        return _CLASS_BINS_CACHE[key]
+
+    stored = {}
+    if cache_path is not None and Path(cache_path).exists():
+        with open(cache_path) as f:
+            stored = json.load(f)
+    if key in stored:
+        edges = np.asarray(stored[key], dtype=float)
+    else:
+        edges = _class_edges(y, scheme, k)
+        if cache_path is not None:
+            stored[key] = edges.tolist()
+            ensure_dir(Path(cache_path).parent)
+            with open(cache_path, 'w') as f:
+                json.dump(stored, f, indent=1)
+    _CLASS_BINS_CACHE[key] = edges
+    return edges
+
+def align_columns_to_geometry(gdf_base: gpd.GeoDataFrame,
+                              df_values: pd.DataFrame,
+                              value_cols: list,
+                              years: list = None):
+    """
+    Pivot long (year, fips5, *value_cols) rows once into a (county x year x column)
+    float array whose rows follow gdf_base's row order, via an integer FIPS index.
+    Maps then select a slice instead of merging (and copying) the geometry.
+    """
+    if years is None:
+        years = sorted(df_values[YEAR_COL].dropna().astype(int).unique().tolist())
+    geo_index = pd.Index(gdf_base['fips5'].astype(int).to_numpy())
+    rows = geo_index.get_indexer(pd.to_numeric(df_values['fips5'], errors='coerce'))
+    cols = pd.Index(years).get_indexer(pd.to_numeric(df_values[YEAR_COL], errors='coerce'))
+    ok = (rows >= 0) & (cols >= 0)
+
+    cube = np.full((len(geo_index), len(years), len(value_cols)), np.nan)
+    cube[rows[ok], cols[ok], :] = df_values[value_cols].to_numpy(dtype=float)[ok]
+    return years, cube
+
+def align_values_to_geometry(gdf_base: gpd.GeoDataFrame,
+                             df_values: pd.DataFrame,
+                             years: list = None):
+    """(county x year) array of the 'value' column; see align_columns_to_geometry."""
+    years, cube = align_columns_to_geometry(gdf_base, df_values, ['value'], years)
+    return years, cube[:, :, 0]
+
 
-    if out_dir is not None:
-        ensure_dir(out_dir)
-        out_path = out_dir / f"county_choropleth_{year}.png"
-        plt.savefig(out_path, dpi=300, bbox_inches='tight')
-        print(f"Saved: {out_path}")
-    plt.close(fig)
+
+def _year_title(year, title: str = MAP_TITLE, corn_only: bool = CORN_FLAG) -> str:
+    if corn_only == True:
+        return f"{title}\nYear: {year}, Corn Growing Counties Only"
+    return f"{title}\nYear: {year}"
 
 
 
 def plot_panel(gdf_base: gpd.GeoDataFrame,
-               df_all: pd.DataFrame,
+               values: np.ndarray,
                years: list,
                vmin=None, vmax=None,
-               out_dir: Path = None):
+               out_dir: Path = None,
+               title: str = MAP_TITLE,
+               cbar_label: str = CBAR_LABEL,
+               corn_only: bool = CORN_FLAG,
+               bins: np.ndarray = None,
+               stem: str = "county_choropleth"):
     """
-    Small-multiples panel for all years.
+    Small-multiples panel for all years. `values` is the (county x year) array
+    from align_values_to_geometry, with columns in the order of `years`.
+    With `bins`, counties are shaded by class (see get_class_bins).
     """
+    if bins is not None:
+        norm = BoundaryNorm(bins, plt.get_cmap(CMAP).N)
+    elif vmin is not None and vmax is not None:
+        norm = plt.Normalize(vmin=vmin, vmax=vmax)
+    else:
+        norm = None
+    # only pass norm for classed maps; geopandas skips vmin/vmax when norm is given
+    norm_kwds = {'norm': norm} if bins is not None else {}
     n = len(years)
     if n == 0:
         return
@@ -238,11 +528,10 @@ def plot_panel(gdf_base: gpd.GeoDataFrame,
     axes = np.array(axes).reshape(-1)
     for i, yr in enumerate(years):
         ax = axes[i]
-        gy = gdf_base.merge(df_all[df_all[YEAR_COL] == yr], on='fips5', how='left')
-        gy.plot(column='value',
+        gdf_base.plot(column=values[:, i],
                 ax=ax, cmap=CMAP, linewidth=LINE_WIDTH, edgecolor=LINE_COLOR,
                 missing_kwds={"color": MISSING_COLOR, "label": "No data"},
-                vmin=vmin, vmax=vmax)
+                vmin=vmin, vmax=vmax, **norm_kwds)
         ax.set_title(str(yr), fontsize=11, fontweight='bold')
         ax.set_axis_off()
     # Hide unused axes
@@ -250,27 +539,241 @@ def plot_panel(gdf_base: gpd.GeoDataFrame,
         axes[j].set_axis_off()
 
     # Colorbar
-    sm = plt.cm.ScalarMappable(cmap=CMAP,
-                               norm=plt.Normalize(vmin=vmin, vmax=vmax) if (vmin is not None and vmax is not None) else None)
+    sm = plt.cm.ScalarMappable(cmap=CMAP, norm=norm)
     sm._A = []
     cbar = fig.colorbar(sm, ax=axes.tolist(), fraction=0.015, pad=0.01)
-    cbar.ax.set_ylabel("Dollars per Farm (2017 $)", rotation=90)
+    cbar.ax.set_ylabel(cbar_label, rotation=90)
     
-    if CORN_FLAG == True:
-        ttl = f"Government Payments per Farm by County (2017 $)\nAll Census Years, Only Corn Growing Counties"
+    if corn_only == True:
+        ttl = f"{title}\nAll Census Years, Only Corn Growing Counties"
     else:
-        ttl = f"Government Payments per Farm by County (2017 $)\nAll Census Years"
+        ttl = f"{title}\nAll Census Years"
     
     fig.suptitle(ttl, fontsize=16, fontweight='bold', y=0.98)
     plt.tight_layout()
 
     if out_dir is not None and SAVE_PANEL_FIG:
         ensure_dir(out_dir)
-        out_path = out_dir / "county_choropleth_all_years_panel.png"
+        out_path = out_dir / f"{stem}_all_years_panel.png"
         plt.savefig(out_path, dpi=300, bbox_inches='tight')
         print(f"Saved: {out_path}")
     plt.close(fig)
 
+# -----------------------------
+# Reusable choropleth renderer
+# -----------------------------
+def _geometry_path(geom) -> MplPath:
+    """One compound path per county (all parts + holes), so patches stay 1:1 with rows."""
+    if geom is None or geom.is_empty:
+        return MplPath(np.empty((0, 2)))
+    rings = []
+    for poly in getattr(geom, 'geoms', [geom]):
+        rings.append(MplPath(np.asarray(poly.exterior.coords)[:, :2], closed=True))
+        rings.extend(MplPath(np.asarray(r.coords)[:, :2], closed=True) for r in poly.interiors)
+    return MplPath.make_compound_path(*rings)
+
+
+class ChoroplethRenderer:
+    """
+    Builds the figure and the county PatchCollection once; each frame only
+    swaps the collection's color array (and the title). Values passed to
+    update() must be aligned to gdf_base rows (see align_values_to_geometry).
+    """
+
+    def __init__(self,
+                 gdf_base: gpd.GeoDataFrame,
+                 vmin=None, vmax=None,
+                 figsize=FIGSIZE_SINGLE,
+                 cmap=CMAP,
+                 cbar_label: str = CBAR_LABEL):
+        # exterior CCW / holes CW so holes are left unfilled
+        geoms = shapely.orient_polygons(np.asarray(gdf_base.geometry.values))
+        cm = plt.get_cmap(cmap).copy()
+        cm.set_bad(MISSING_COLOR)
+
+        self.vmin, self.vmax, self.bins = vmin, vmax, None
+        self.norm = plt.Normalize(vmin=vmin, vmax=vmax)
+        self.fig, self.ax = plt.subplots(1, 1, figsize=figsize)
+        self.collection = PatchCollection([PathPatch(_geometry_path(g)) for g in geoms],
+                                          cmap=cm, norm=self.norm,
+                                          edgecolor=LINE_COLOR, linewidth=LINE_WIDTH)
+        self.collection.set_array(np.ma.masked_all(len(geoms)))
+        self.ax.add_collection(self.collection)
+
+        minx, miny, maxx, maxy = gdf_base.total_bounds
+        self.ax.set_xlim(minx, maxx)
+        self.ax.set_ylim(miny, maxy)
+        self.ax.set_aspect('equal')
+        self.ax.set_axis_off()
+        self.title = self.ax.set_title("", fontsize=14, fontweight='bold')
+
+        self.cbar = self.fig.colorbar(self.collection, ax=self.ax, fraction=0.030, pad=0.02)
+        self.cbar.ax.set_ylabel(cbar_label, rotation=90)
+        self.fig.tight_layout()
+
+    def set_limits(self, vmin=None, vmax=None, bins=None):
+        """Linear scale (vmin/vmax; None = autoscale per frame) or class edges."""
+        self.vmin, self.vmax, self.bins = vmin, vmax, bins
+        if bins is not None:
+            self.norm = BoundaryNorm(bins, self.collection.cmap.N)
+        elif isinstance(self.norm, BoundaryNorm):
+            self.norm = plt.Normalize(vmin=vmin, vmax=vmax)
+        self.collection.set_norm(self.norm)
+
+    def set_label(self, cbar_label: str):
+        self.cbar.ax.set_ylabel(cbar_label, rotation=90)
+
+    def update(self, values: np.ndarray, title: str = None):
+        """Recolor the existing patches; NaNs are drawn in MISSING_COLOR."""
+        arr = np.ma.masked_invalid(np.asarray(values, dtype=float))
+        if self.bins is None:
+            self.norm.vmin, self.norm.vmax = self.vmin, self.vmax
+            if self.vmin is None or self.vmax is None:
+                self.norm.autoscale_None(arr)
+        self.collection.set_array(arr)
+        if title is not None:
+            self.title.set_text(title)
+        return self.collection, self.title
+
+    def save(self, out_path: Path, dpi: int = 300):
+        self.fig.savefig(out_path, dpi=dpi, bbox_inches='tight')
+        print(f"Saved: {out_path}")
+
+    def close(self):
+        plt.close(self.fig)
+
+
+def render_timelapse(gdf_base: gpd.GeoDataFrame,
+                     values: np.ndarray,
+                     years: list,
+                     out_path: Path,
+                     vmin=None, vmax=None,
+                     fps: int = ANIMATION_FPS,
+                     tween: int = ANIMATION_TWEEN,
+                     dpi: int = ANIMATION_DPI,
+                     title: str = MAP_TITLE,
+                     cbar_label: str = CBAR_LABEL,
+                     corn_only: bool = CORN_FLAG,
+                     bins: np.ndarray = None):
+    """
+    Time-lapse of the (county x year) array. `tween` linearly interpolated frames
+    are inserted between census years. Writes .mp4 with ffmpeg, anything else
+    (e.g. .gif) with Pillow.
+    """
+    from matplotlib.animation import FuncAnimation, FFMpegWriter, PillowWriter
+
+    if len(years) == 0:
+        return
+    frames = []
+    for i, yr in enumerate(years):
+        frames.append((values[:, i], _year_title(yr, title, corn_only)))
+        if i + 1 < len(years):
+            for k in range(1, tween + 1):
+                w = k / (tween + 1)
+                interp = (1 - w) * values[:, i] + w * values[:, i + 1]
+                frames.append((interp, _year_title(f"{yr}–{years[i + 1]}", title, corn_only)))
+
+    renderer = ChoroplethRenderer(gdf_base, vmin=vmin, vmax=vmax, cbar_label=cbar_label)
+    renderer.set_limits(vmin, vmax, bins)
+    anim = FuncAnimation(renderer.fig, lambda f: renderer.update(*f),
+                         frames=frames, blit=False, cache_frame_data=False)
+    out_path = Path(out_path)
+    ensure_dir(out_path.parent)
+    writer = FFMpegWriter(fps=fps) if out_path.suffix.lower() == '.mp4' else PillowWriter(fps=fps)
+    anim.save(out_path, writer=writer, dpi=dpi)
+    renderer.close()
+    print(f"Saved: {out_path}")
+
+# -----------------------------
+# Parallel per-year rendering
+# -----------------------------
+# Each worker process loads the projected counties and builds one renderer once
+# (pool initializer), then only receives the year's aligned value vector for
+# every task. Row order matches the parent's geometry because the cache is.
+_WORKER_RENDERER = None
+
+def _init_map_worker(shp_path: str, conus_only: bool, tolerance: float, key: str):
+    global _WORKER_RENDERER
+    plt.switch_backend('Agg')
+    gdf = load_counties_cached(Path(shp_path), conus_only=conus_only,
+                               tolerance=tolerance, key=key)
+    _WORKER_RENDERER = ChoroplethRenderer(gdf)
+
+def _render_with(renderer: ChoroplethRenderer, yr, vals, vmin, vmax, out_dir,
+                 title=MAP_TITLE, cbar_label=CBAR_LABEL, corn_only=CORN_FLAG, bins=None,
+                 stem="county_choropleth"):
+    renderer.set_limits(vmin, vmax, bins)
+    renderer.set_label(cbar_label)
+    renderer.update(vals, title=_year_title(yr, title, corn_only))
+    if out_dir is not None:
+        ensure_dir(out_dir)
+        renderer.save(out_dir / f"{stem}_{yr}.png", dpi=300)
+
+def _render_year_task(args):
+    _render_with(_WORKER_RENDERER, *args)
+    return args[0]
+
+def year_map_tasks(values: np.ndarray,
+                   years: list,
+                   vmin=None, vmax=None,
+                   out_dir: Path = None,
+                   title: str = MAP_TITLE,
+                   cbar_label: str = CBAR_LABEL,
+                   corn_only: bool = CORN_FLAG,
+                   bins: np.ndarray = None) -> list:
+    """One render task per year: (year, value vector, vmin, vmax, out_dir, labels..., bins)."""
+    return [(yr, values[:, i], vmin, vmax, out_dir, title, cbar_label, corn_only, bins)
+            for i, yr in enumerate(years)]
+
+def render_year_maps(shp_path: Path,
+                     tasks: list,
+                     n_workers: int = N_WORKERS,
+                     gdf_base: gpd.GeoDataFrame = None,
+                     tolerance: float = MAP_TOLERANCE,
+                     cache_key: str = None):
+    """
+    Render the per-year choropleth tasks (see year_map_tasks), possibly from
+    several jobs. With n_workers > 1 they are spread over a process pool whose
+    workers load county geometry once at startup.
+    """
+    n_workers = max(1, min(n_workers or 1, len(tasks)))
+
+    if n_workers == 1:
+        gdf = gdf_base if gdf_base is not None else load_counties_cached(
+            shp_path, conus_only=CONUS_ONLY, tolerance=tolerance, key=cache_key)
+        renderer = ChoroplethRenderer(gdf)
+        for task in tasks:
+            _render_with(renderer, *task)
+        renderer.close()
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             initializer=_init_map_worker,
+                             initargs=(str(shp_path), CONUS_ONLY, tolerance, cache_key)) as pool:
+        for yr in pool.map(_render_year_task, tasks):
+            print(f"Rendered {yr}")
+
+def job_tag(job: dict) -> str:
+    """Output subfolder name for a MAP_JOBS entry."""
+    tag = job['value_col']
+    if job.get('geo', 'county') != 'county':
+        tag = f"{job['geo']}_{tag}"
+    if job.get('corn_cutoff') is not None:
+        tag += f"_corn{job['corn_cutoff']:g}"
+    scheme = job.get('scheme', 'linear')
+    if scheme != 'linear':
+        return f"{tag}_{scheme}{job.get('k', 5)}"
+    return f"{tag}_{job.get('normalize', 'global')}"
+
+def job_values(cube: np.ndarray, col_idx: int, corn: np.ndarray, corn_cutoff=None) -> np.ndarray:
+    """(county x year) values for one job; counties failing the corn cutoff become NaN."""
+    values = cube[:, :, col_idx]
+    if corn_cutoff is None:
+        return values
+    with np.errstate(invalid='ignore'):
+        keep = corn > corn_cutoff
+    return np.where(keep, values, np.nan)
+
 def main():
     # Paths
     county_dir = Path(COUNTY_SAVE_DIR)
@@ -280,24 +783,82 @@ def main():
     # 1) Download county boundaries
     shp_path = download_counties_if_needed(county_dir, COUNTY_ZIP_URL, COUNTY_SHP_STEM)
 
-    # 2) Load counties & data
-    gdf_counties = load_counties(shp_path, conus_only=CONUS_ONLY)
-    df_values = load_value_data(data_path, YEAR_COL, LEVEL_COL, FIPS_COL, VALUE_COL)
-
-    # 3) Global scale (optional)
-    if NORMALIZE_GLOBAL:
-        vmin, vmax = compute_global_scale(df_values['value'], clip_q=CLIP_QUANTILES)
-    else:
-        vmin = vmax = None
-
-    # 4) Plot per-year maps
-    years = sorted(df_values[YEAR_COL].dropna().astype(int).unique().tolist())
-    for yr in years:
-        df_y = df_values[df_values[YEAR_COL] == yr]
-        plot_year_map(gdf_counties, df_y, yr, vmin=vmin, vmax=vmax, out_dir=figs_dir)
-
-    # 5) Small-multiples panel
-    plot_panel(gdf_counties, df_values, years, vmin=vmin, vmax=vmax, out_dir=figs_dir)
+    # 2) Load counties (from the boundary cache) & all job columns in one pass
+    cache_key = boundary_cache_key(shp_path, PROJ_CRS, CONUS_ONLY)
+    gdf_counties = load_counties_cached(shp_path, CONUS_ONLY, MAP_TOLERANCE, key=cache_key)
+    gdf_panel = load_counties_cached(shp_path, CONUS_ONLY, PANEL_TOLERANCE, key=cache_key)
+    wanted = [j['value_col'] for j in MAP_JOBS] + [j['weight_col'] for j in MAP_JOBS if j.get('weight_col')]
+    df_values, col_map = load_panel_values(data_path, wanted)
+
+    # 3) Align every column to the geometry once
+    value_cols = [c for c in df_values.columns if c not in (YEAR_COL, 'fips5')]
+    years, cube = align_columns_to_geometry(gdf_counties, df_values, value_cols)
+    corn = cube[:, :, value_cols.index(CORN_COL)] if CORN_COL in value_cols else None
+
+    # 4) Build per-job values, scales / class bins and render tasks
+    bins_path = Path(OUTPUT_DIR) / TABS_DIR / CLASS_BINS_FILE
+    tasks, jobs_ready, group_jobs = [], [], []
+    for job in MAP_JOBS:
+        col = col_map.get(job['value_col'])
+        cutoff = job.get('corn_cutoff')
+        if col is None or (cutoff is not None and corn is None):
+            print(f"Skipping job {job}: column not found in data.")
+            continue
+        values = job_values(cube, value_cols.index(col), corn, cutoff)
+        geo = job.get('geo', 'county')
+        if geo != 'county':
+            # Aggregate counties to cached state / region polygons (panel tolerance)
+            try:
+                gdf_groups = load_groups_cached(shp_path, geo, CONUS_ONLY, PANEL_TOLERANCE, key=cache_key)
+            except FileNotFoundError as e:
+                print(f"Skipping job {job}: {e}")
+                continue
+            codes = county_group_codes(gdf_counties, geo)
+            group_rows = pd.Index(gdf_groups['group']).get_indexer(codes)
+            wcol = col_map.get(job.get('weight_col'))
+            weights = cube[:, :, value_cols.index(wcol)] if wcol else None
+            values = aggregate_to_groups(values, group_rows, len(gdf_groups),
+                                         weights=weights, agg=job.get('agg', 'mean'))
+        bins = None
+        scheme = job.get('scheme', 'linear')
+        if scheme != 'linear':
+            bins = get_class_bins(values, scheme, job.get('k', 5),
+                                  name=job_tag(job), cache_path=bins_path)
+        if bins is not None:
+            vmin, vmax = float(bins[0]), float(bins[-1])
+        elif job.get('normalize', 'global') == 'global':
+            finite = values[np.isfinite(values)]
+            vmin, vmax = compute_global_scale(pd.Series(finite), clip_q=CLIP_QUANTILES)
+        else:
+            vmin = vmax = None
+        labels = dict(title=job.get('title', MAP_TITLE),
+                      cbar_label=job.get('cbar_label', CBAR_LABEL),
+                      corn_only=cutoff is not None)
+        out_dir = figs_dir / job_tag(job)
+        if geo != 'county':
+            group_jobs.append((gdf_groups, values, vmin, vmax, bins, out_dir, labels, f"{geo}_choropleth"))
+            continue
+        tasks += year_map_tasks(values, years, vmin, vmax, out_dir, bins=bins, **labels)
+        jobs_ready.append((gdf_panel, values, vmin, vmax, bins, out_dir, labels, "county_choropleth"))
+
+    # 5) Per-year maps for all jobs from one worker pool
+    render_year_maps(shp_path, tasks, n_workers=N_WORKERS, gdf_base=gdf_counties,
+                     tolerance=MAP_TOLERANCE, cache_key=cache_key)
+
+    # State / region maps: few polygons, so render them in-process with one renderer each
+    for gdf_groups, values, vmin, vmax, bins, out_dir, labels, stem in group_jobs:
+        renderer = ChoroplethRenderer(gdf_groups)
+        for task in year_map_tasks(values, years, vmin, vmax, out_dir, bins=bins, **labels):
+            _render_with(renderer, *task, stem=stem)
+        renderer.close()
+
+    # 6) Small-multiples panels (coarser geometry, same row order) and time-lapses
+    for gdf_base, values, vmin, vmax, bins, out_dir, labels, stem in jobs_ready + group_jobs:
+        plot_panel(gdf_base, values, years, vmin=vmin, vmax=vmax, out_dir=out_dir,
+                   bins=bins, stem=stem, **labels)
+        if SAVE_ANIMATION:
+            render_timelapse(gdf_base, values, years, out_dir / ANIMATION_FILE,
+                             vmin=vmin, vmax=vmax, bins=bins, **labels)
 
 if __name__ == "__main__":
     main()
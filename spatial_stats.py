@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Spatial structure for the county panel: cached contiguity, spatial lags,
+neighbour-smoothed choropleths and Moran's I.
+
+Requires: everything plot.py needs, plus scipy.
+
+This script will:
+1) Build (once) a queen or rook contiguity matrix over the cached CONUS counties
+   and store it as a sparse .npz next to the boundary cache, keyed by FIPS.
+2) Compute global Moran's I for each configured variable and year -> tabs/.
+3) Write local Moran's I (LISA) values and quadrants per county-year -> tabs/.
+4) Render choropleths where suppressed counties are filled from their neighbours.
+"""
+
+# -----------------------------
+# Configuration
+# -----------------------------
+CONTIGUITY      = "queen"                  # 'queen' (shared point) or 'rook' (shared edge)
+SPATIAL_VARS    = ["gov_all_pf_real", "gov_noncons_pf_calc_real", "share_corn_harvested_acres"]
+FILL_ITERATIONS = 2                        # neighbour passes when filling suppressed counties
+SAVE_SMOOTHED   = True
+MORAN_FILE      = "morans_i_global.csv"
+LISA_FILE       = "morans_i_local.tsv"
+
+# -----------------------------
+# Script
+# -----------------------------
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+
+from plot import (
+    OUTPUT_DIR, FIGS_DIR, TABS_DIR, DATA_FILE_PATH, COUNTY_SAVE_DIR, COUNTY_ZIP_URL,
+    COUNTY_SHP_STEM, BOUNDARY_CACHE_DIR, CONUS_ONLY, MAP_TOLERANCE, PANEL_TOLERANCE,
+    PROJ_CRS, CLIP_QUANTILES, YEAR_COL,
+    ensure_dir, download_counties_if_needed, boundary_cache_key, load_counties_cached,
+    load_panel_values, align_columns_to_geometry, compute_global_scale,
+    ChoroplethRenderer, year_map_tasks, _render_with, plot_panel,
+)
+
+
+def build_contiguity(gdf, kind: str = CONTIGUITY) -> sparse.csr_matrix:
+    """
+    Binary symmetric contiguity over gdf rows. Candidate pairs come from one
+    STRtree query; rook keeps only pairs whose shared boundary has length.
+    """
+    geoms = np.asarray(gdf.geometry.values)
+    tree = shapely.STRtree(geoms)
+    i, j = tree.query(geoms, predicate='intersects')
+    keep = i != j
+    i, j = i[keep], j[keep]
+    if kind == 'rook':
+        shared = shapely.intersection(geoms[i], geoms[j])
+        edge = shapely.length(shared) > 0
+        i, j = i[edge], j[edge]
+    elif kind != 'queen':
+        raise ValueError("kind must be 'queen' or 'rook'")
+    n = len(geoms)
+    W = sparse.csr_matrix((np.ones(len(i)), (i, j)), shape=(n, n))
+    return ((W + W.T) > 0).astype(float).tocsr()
+
+
+def load_contiguity_cached(shp_path: Path,
+                           kind: str = CONTIGUITY,
+                           conus_only: bool = CONUS_ONLY,
+                           cache_dir: Path = None,
+                           key: str = None):
+    """
+    (W, fips) from the cache, building it on a miss. `fips` gives the integer
+    county FIPS of each row/column of W (same order as the cached counties).
+    """
+    cache_dir = Path(cache_dir or BOUNDARY_CACHE_DIR)
+    key = key or boundary_cache_key(shp_path, PROJ_CRS, conus_only)
+    path = cache_dir / f"contiguity_{kind}_{key}.npz"
+    if path.exists():
+        z = np.load(path)
+        W = sparse.csr_matrix((z['data'], z['indices'], z['indptr']), shape=tuple(z['shape']))
+        return W, z['fips']
+
+    gdf = load_counties_cached(shp_path, conus_only=conus_only, tolerance=0,
+                               cache_dir=cache_dir, key=key)
+    W = build_contiguity(gdf, kind)
+    fips = gdf['fips5'].astype(int).to_numpy()
+    ensure_dir(cache_dir)
+    tmp_path = path.with_suffix('.tmp.npz')
+    np.savez(tmp_path, data=W.data, indices=W.indices, indptr=W.indptr,
+             shape=np.array(W.shape), fips=fips)
+    tmp_path.replace(path)
+    print(f"Cached {kind} contiguity ({W.nnz // 2} links): {path}")
+    return W, fips
+
+
+def reorder_contiguity(W: sparse.csr_matrix, fips: np.ndarray, target_fips) -> sparse.csr_matrix:
+    """Permute/subset W to the row order of `target_fips` (unknown FIPS get no neighbours)."""
+    pos = pd.Index(fips).get_indexer(np.asarray(target_fips, dtype=int))
+    ok = pos >= 0
+    P = sparse.csr_matrix((np.ones(ok.sum()), (np.flatnonzero(ok), pos[ok])),
+                          shape=(len(pos), W.shape[0]))
+    return (P @ W @ P.T).tocsr()
+
+
+def spatial_lag(W: sparse.csr_matrix, values: np.ndarray) -> np.ndarray:
+    """
+    Mean of the observed neighbours for every row and column of `values`
+    (county x year, or a single vector). NaN where no neighbour is observed.
+    """
+    x = np.asarray(values, dtype=float)
+    obs = np.isfinite(x)
+    num = W @ np.where(obs, x, 0.0)
+    den = W @ obs.astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(den > 0, num / den, np.nan)
+
+
+def fill_from_neighbours(W: sparse.csr_matrix, values: np.ndarray,
+                         iterations: int = FILL_ITERATIONS) -> np.ndarray:
+    """Fill NaN counties with their neighbours' mean, repeating to reach interior gaps."""
+    x = np.array(values, dtype=float)
+    for _ in range(iterations):
+        missing = ~np.isfinite(x)
+        if not missing.any():
+            break
+        x = np.where(missing, spatial_lag(W, x), x)
+    return x
+
+
+def _observed_weights(W: sparse.csr_matrix, x: np.ndarray):
+    """Row-standardized W restricted to observed counties (drop islands)."""
+    obs = np.flatnonzero(np.isfinite(x))
+    Wo = W[obs][:, obs]
+    rs = np.asarray(Wo.sum(axis=1)).ravel()
+    has_nb = rs > 0
+    Wo = Wo[has_nb][:, has_nb]
+    rs = rs[has_nb]
+    Wo = sparse.diags(1.0 / rs) @ Wo
+    return obs[has_nb], Wo.tocsr()
+
+
+def morans_i(W: sparse.csr_matrix, values: np.ndarray) -> dict:
+    """
+    Global Moran's I with row-standardized weights over observed counties,
+    with the normality-assumption expectation, variance and z-score. All NaN
+    with fewer than 3 counties or a constant variable (I is undefined).
+    """
+    rows, Wo = _observed_weights(W, values)
+    n = len(rows)
+    undefined = {'n': n, 'I': np.nan, 'E_I': np.nan, 'z': np.nan}
+    if n < 3:
+        return undefined
+    z = values[rows] - values[rows].mean()
+    if not (z @ z) > 0:
+        return undefined
+    s0 = Wo.sum()
+    I = (n / s0) * (z @ (Wo @ z)) / (z @ z)
+    e_i = -1.0 / (n - 1)
+    s1 = 0.5 * (Wo + Wo.T).power(2).sum()
+    s2 = ((np.asarray(Wo.sum(axis=1)).ravel() + np.asarray(Wo.sum(axis=0)).ravel()) ** 2).sum()
+    var = (n * n * s1 - n * s2 + 3 * s0 * s0) / ((n * n - 1) * s0 * s0) - e_i ** 2
+    return {'n': n, 'I': float(I), 'E_I': e_i, 'z': float((I - e_i) / np.sqrt(var))}
+
+
+def local_morans_i(W: sparse.csr_matrix, values: np.ndarray):
+    """
+    Local Moran's I per county (NaN where unobserved or without observed
+    neighbours, and everywhere for a constant variable) and its quadrant:
+    HH, LL, HL, LH.
+    """
+    rows, Wo = _observed_weights(W, values)
+    out = np.full(len(values), np.nan)
+    quad = np.full(len(values), None, dtype=object)
+    if len(rows) < 3:
+        return out, quad
+    z = values[rows] - values[rows].mean()
+    m2 = (z @ z) / len(z)
+    if not m2 > 0:
+        return out, quad
+    lag = Wo @ z
+    out[rows] = z * lag / m2
+    quad[rows] = np.select([(z > 0) & (lag > 0), (z < 0) & (lag < 0), (z > 0) & (lag < 0)],
+                           ['HH', 'LL', 'HL'], 'LH')
+    return out, quad
+
+
+def main():
+    county_dir = Path(COUNTY_SAVE_DIR)
+    figs_dir = Path(OUTPUT_DIR) / FIGS_DIR
+    tabs_dir = Path(OUTPUT_DIR) / TABS_DIR
+    ensure_dir(tabs_dir)
+
+    shp_path = download_counties_if_needed(county_dir, COUNTY_ZIP_URL, COUNTY_SHP_STEM)
+    cache_key = boundary_cache_key(shp_path, PROJ_CRS, CONUS_ONLY)
+    gdf_counties = load_counties_cached(shp_path, CONUS_ONLY, MAP_TOLERANCE, key=cache_key)
+    W, w_fips = load_contiguity_cached(shp_path, CONTIGUITY, CONUS_ONLY, key=cache_key)
+    W = reorder_contiguity(W, w_fips, gdf_counties['fips5'].astype(int))
+
+    df_values, col_map = load_panel_values(Path(DATA_FILE_PATH), SPATIAL_VARS)
+    value_cols = [col_map[v] for v in SPATIAL_VARS if col_map.get(v)]
+    years, cube = align_columns_to_geometry(gdf_counties, df_values, value_cols)
+    fips5 = gdf_counties['fips5'].to_numpy()
+
+    global_rows, local_frames = [], []
+    for k, var in enumerate(value_cols):
+        for t, yr in enumerate(years):
+            x = cube[:, t, k]
+            global_rows.append({'variable': var, YEAR_COL: yr, **morans_i(W, x)})
+            li, quad = local_morans_i(W, x)
+            keep = np.isfinite(li)
+            local_frames.append(pd.DataFrame({'variable': var, YEAR_COL: yr, 'fips5': fips5[keep],
+                                              'local_i': li[keep], 'quadrant': quad[keep]}))
+
+    out_global = tabs_dir / MORAN_FILE
+    pd.DataFrame(global_rows).to_csv(out_global, index=False)
+    print(f"Saved: {out_global}")
+    out_local = tabs_dir / LISA_FILE
+    pd.concat(local_frames, ignore_index=True).to_csv(out_local, sep="\t", index=False)
+    print(f"Saved: {out_local}")
+
+    if SAVE_SMOOTHED:
+        gdf_panel = load_counties_cached(shp_path, CONUS_ONLY, PANEL_TOLERANCE, key=cache_key)
+        renderer = ChoroplethRenderer(gdf_counties)
+        for k, var in enumerate(value_cols):
+            filled = fill_from_neighbours(W, cube[:, :, k])
+            finite = filled[np.isfinite(filled)]
+            vmin, vmax = compute_global_scale(pd.Series(finite), clip_q=CLIP_QUANTILES)
+            out_dir = figs_dir / f"smoothed_{var}"
+            labels = dict(title=f"{var} (suppressed counties filled from neighbours)",
+                          cbar_label=var, corn_only=False)
+            for task in year_map_tasks(filled, years, vmin, vmax, out_dir, **labels):
+                _render_with(renderer, *task)
+            plot_panel(gdf_panel, filled, years, vmin=vmin, vmax=vmax, out_dir=out_dir, **labels)
+        renderer.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Chunked Stata .dta (format 118, Stata 14+) writer for the merged panel.
+
+pandas' to_stata builds the whole file in memory and converts column by
+column; here the header, labels and value-label tables are written once and
+the data section is streamed as fixed-width numpy records, CHUNK_ROWS at a
+time. Storage types are the smallest Stata type that holds each column
+(byte/int/long, float for float32, double for float64, str# for text), with
+pandas missing values mapped to Stata's system missing '.'.
+
+    write_dta(df, "panel.dta",
+              variable_labels={'farms_n': 'Farms (number)'},
+              value_labels={'level': {1: 'County', 2: 'State', 3: 'National'}})
+"""
+
+import os
+import re
+import struct
+import datetime as dt
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+CHUNK_ROWS = 100_000
+
+# Stata 118 type codes, numpy storage and system-missing values
+_BYTE, _INT, _LONG, _FLOAT, _DOUBLE = 65530, 65529, 65528, 65527, 65526
+_NUMERIC = {
+    _BYTE:   ('<i1', -127, 100, 101, '%8.0g'),
+    _INT:    ('<i2', -32767, 32740, 32741, '%8.0g'),
+    _LONG:   ('<i4', -2147483647, 2147483620, 2147483621, '%12.0g'),
+    _FLOAT:  ('<f4', None, None, struct.unpack('<f', b'\x00\x00\x00\x7f')[0], '%9.0g'),
+    _DOUBLE: ('<f8', None, None, struct.unpack('<d', b'\x00\x00\x00\x00\x00\x00\xe0\x7f')[0], '%10.0g'),
+}
+_MAX_STR = 2045
+
+
+def _stata_name(name: str, taken: set) -> str:
+    """Valid, unique Stata variable name (<= 32 chars)."""
+    base = re.sub(r'\W', '_', str(name))
+    if not re.match(r'[A-Za-z_]', base):
+        base = '_' + base
+    base = base[:32]
+    out, i = base, 1
+    while out in taken:
+        suffix = f"_{i}"
+        out, i = base[:32 - len(suffix)] + suffix, i + 1
+    taken.add(out)
+    return out
+
+
+def _column_type(s: pd.Series):
+    """(Stata type code, numpy record dtype, is_string) for one column; str# codes are the width."""
+    if isinstance(s.dtype, pd.CategoricalDtype) or s.dtype == object or pd.api.types.is_string_dtype(s):
+        longest = s.dropna().astype(str).str.encode('utf-8').str.len().max()
+        width = min(max(int(longest) if pd.notna(longest) else 1, 1), _MAX_STR)
+        return width, f'S{width}', True
+    if pd.api.types.is_bool_dtype(s) or pd.api.types.is_integer_dtype(s):
+        vals = pd.to_numeric(s, errors='coerce').dropna()
+        lo, hi = (int(vals.min()), int(vals.max())) if len(vals) else (0, 0)
+        for code in (_BYTE, _INT, _LONG):
+            _, vmin, vmax, _, _ = _NUMERIC[code]
+            if vmin <= lo and hi <= vmax:
+                return code, _NUMERIC[code][0], False
+        return _DOUBLE, '<f8', False
+    if s.dtype == np.float32:
+        return _FLOAT, '<f4', False
+    return _DOUBLE, '<f8', False
+
+
+def _fixed(text: str, width: int) -> bytes:
+    b = str(text).encode('utf-8')[:width - 1]
+    return b + b'\x00' * (width - len(b))
+
+
+def _tag(name: str, payload: bytes = b'') -> bytes:
+    return f"<{name}>".encode() + payload + f"</{name}>".encode()
+
+
+def _value_label_table(name: str, mapping: dict) -> bytes:
+    items = sorted((int(k), str(v)) for k, v in mapping.items())
+    txt, off = b'', []
+    for _, label in items:
+        off.append(len(txt))
+        txt += label.encode('utf-8')[:32000] + b'\x00'
+    n = len(items)
+    table = (struct.pack('<ii', n, len(txt))
+             + struct.pack(f'<{n}i', *off)
+             + struct.pack(f'<{n}i', *(k for k, _ in items))
+             + txt)
+    return _tag('lbl', struct.pack('<i', len(table)) + _fixed(name, 129) + b'\x00' * 3 + table)
+
+
+def write_dta(df: pd.DataFrame,
+              path,
+              variable_labels: dict = None,
+              value_labels: dict = None,
+              data_label: str = '',
+              chunk_rows: int = CHUNK_ROWS) -> Path:
+    """
+    Write df as a Stata 118 .dta through a temp file and rename. `value_labels`
+    maps column -> {int code: label}; the label set is named after the column.
+    """
+    path = Path(path)
+    variable_labels = variable_labels or {}
+    value_labels = {c: m for c, m in (value_labels or {}).items() if c in df.columns}
+    n, k = len(df), len(df.columns)
+
+    taken = set()
+    names = [_stata_name(c, taken) for c in df.columns]
+    types = [_column_type(df[c]) for c in df.columns]
+    record = np.dtype([(f"v{i}", t[1]) for i, t in enumerate(types)])
+    formats = [f"%{t[0]}s" if t[2] else _NUMERIC[t[0]][4] for t in types]
+    lbl_names = [names[i] if c in value_labels else '' for i, c in enumerate(df.columns)]
+
+    now = dt.datetime.now().strftime('%d %b %Y %H:%M').encode()
+    label = data_label.encode('utf-8')[:80]
+    header = _tag('header',
+                  _tag('release', b'118') + _tag('byteorder', b'LSF')
+                  + _tag('K', struct.pack('<H', k)) + _tag('N', struct.pack('<Q', n))
+                  + _tag('label', struct.pack('<H', len(label)) + label)
+                  + _tag('timestamp', struct.pack('<B', len(now)) + now))
+
+    sections = [
+        ('variable_types', b''.join(struct.pack('<H', t[0]) for t in types)),
+        ('varnames', b''.join(_fixed(v, 129) for v in names)),
+        ('sortlist', b'\x00\x00' * (k + 1)),
+        ('formats', b''.join(_fixed(f, 57) for f in formats)),
+        ('value_label_names', b''.join(_fixed(v, 129) for v in lbl_names)),
+        ('variable_labels', b''.join(_fixed(variable_labels.get(c, ''), 321) for c in df.columns)),
+        ('characteristics', b''),
+    ]
+    value_label_bytes = b''.join(_value_label_table(lbl_names[list(df.columns).index(c)], m)
+                                 for c, m in value_labels.items())
+
+    # offsets for <map>: computed from section sizes (data size is fixed-width)
+    opening = b'<stata_dta>'
+    map_len = len(_tag('map', b'\x00' * 8 * 14))
+    offsets = [0, len(opening) + len(header)]
+    pos = offsets[1] + map_len
+    for name, payload in sections:
+        offsets.append(pos)
+        pos += len(_tag(name, payload))
+    offsets.append(pos)                                   # <data>
+    pos += len(_tag('data')) + n * record.itemsize
+    offsets.append(pos)                                   # <strls>
+    pos += len(_tag('strls'))
+    offsets.append(pos)                                   # <value_labels>
+    pos += len(_tag('value_labels', value_label_bytes))
+    offsets.append(pos)                                   # </stata_dta>
+    offsets.append(pos + len(b'</stata_dta>'))            # end of file
+
+    missing_before = df.isna().sum()       # the caller's frame must come back untouched
+    tmp = path.with_name(f".{path.name}.tmp")
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(opening + header + _tag('map', struct.pack('<14Q', *offsets)))
+            for name, payload in sections:
+                f.write(_tag(name, payload))
+            f.write(b'<data>')
+            for start in range(0, n, chunk_rows):
+                chunk = df.iloc[start:start + chunk_rows]
+                rec = np.empty(len(chunk), dtype=record)
+                for i, (col, t) in enumerate(zip(df.columns, types)):
+                    s = chunk[col]
+                    if t[2]:
+                        rec[f"v{i}"] = s.astype(object).where(s.notna(), '').astype(str).str.encode('utf-8').to_numpy()
+                    else:
+                        # copy: for float64 columns to_numpy is a view of the caller's frame
+                        vals = pd.to_numeric(s, errors='coerce').to_numpy('float64', na_value=np.nan, copy=True)
+                        vals[~np.isfinite(vals)] = _NUMERIC[t[0]][3]
+                        rec[f"v{i}"] = vals.astype(t[1])
+                f.write(rec.tobytes())
+            f.write(b'</data>' + _tag('strls') + _tag('value_labels', value_label_bytes) + b'</stata_dta>')
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    if not df.isna().sum().equals(missing_before):
+        raise RuntimeError("write_dta modified its input frame (missing values overwritten)")
+    return path